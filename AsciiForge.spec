@@ -5,7 +5,7 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('canvas.py', '.'), ('example.py', '.')],
+    datas=[('canvas.py', '.'), ('example.py', '.'), ('converter.py', '.'), ('cache.py', '.'), ('worker.py', '.'), ('library.py', '.'), ('search.py', '.'), ('console.py', '.'), ('color.py', '.'), ('glyphs.py', '.'), ('subpixel.py', '.'), ('output.py', '.'), ('files.py', '.'), ('art_library.afl', '.')],
     hiddenimports=['PIL', 'PIL.Image', 'PIL.ImageDraw'],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,187 @@
+"""
+Animation module for AsciiForge - Streaming conversion of animated images
+"""
+import queue
+import threading
+from collections import namedtuple
+from PIL import Image, ImageSequence
+
+import converter
+
+
+# One converted frame: ``spans`` is a list of (row, column, text) changes
+# relative to the previous frame; the first frame contains every row.
+AsciiFrame = namedtuple('AsciiFrame', ['index', 'duration', 'width', 'height', 'spans'])
+
+DEFAULT_DURATION = 100  # ms, used when a frame does not specify one
+PREFETCH_DEPTH = 4
+
+_DONE = object()
+
+
+def prefetch(iterable, depth=PREFETCH_DEPTH):
+    """Iterate ``iterable`` on a background thread, buffering up to ``depth`` items
+
+    The bounded queue keeps memory flat: the producer blocks once it is
+    ``depth`` items ahead. Exceptions raised by the producer are re-raised
+    in the consumer.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        buffer.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            item = _DONE
+        except BaseException as e:
+            item = e
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    worker = threading.Thread(target=produce, name='asciiforge-prefetch', daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def decoded_frames(image, width=100):
+    """Yield (duration, grayscale frame) pairs resized to ``width`` columns"""
+    for frame in ImageSequence.Iterator(image):
+        duration = frame.info.get('duration') or DEFAULT_DURATION
+        small = converter.grayscale(converter.resize_image(frame.convert('RGB'), width))
+        yield duration, small
+
+
+def _first_difference(a, b):
+    """Index of the first differing character of two equal-length strings"""
+    lo, hi = 0, len(a)
+    # Binary search on prefix equality keeps the comparisons in C
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if a[lo:mid + 1] == b[lo:mid + 1]:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def diff_rows(previous, current, width):
+    """Return (row, column, text) spans where ``current`` differs from ``previous``
+
+    Both arguments are flat glyph strings of the same size. Each changed
+    row yields a single span covering its first to last changed cell.
+    """
+    spans = []
+    for row, start in enumerate(range(0, len(current), width)):
+        old = previous[start:start + width]
+        new = current[start:start + width]
+        if old == new:
+            continue
+        first = _first_difference(old, new)
+        last = width - _first_difference(old[::-1], new[::-1])
+        spans.append((row, first, new[first:last]))
+    return spans
+
+
+def animation_frames(image, width=100, chars=converter.ASCII_CHARS):
+    """Convert every frame of an animated image, yielding AsciiFrame deltas
+
+    Frames are decoded on a background thread and only the previous frame's
+    glyphs are kept, so memory stays constant for arbitrarily long inputs.
+    """
+    previous = None
+    for index, (duration, frame) in enumerate(prefetch(decoded_frames(image, width))):
+        current = converter.pixels_to_ascii(frame, chars)
+        if previous is None or len(previous) != len(current):
+            spans = [(row, 0, current[start:start + frame.width])
+                     for row, start in enumerate(range(0, len(current), frame.width))]
+        else:
+            spans = diff_rows(previous, current, frame.width)
+        previous = current
+        yield AsciiFrame(index, duration, frame.width, frame.height, spans)
+
+
+def save(image_path, path, width=100, keyframe_interval=None):
+    """Convert every frame of an animated image into an animation file
+
+    Returns the number of frames written.
+    """
+    import animfile
+    interval = keyframe_interval or animfile.KEYFRAME_INTERVAL
+    writer = None
+    try:
+        with Image.open(image_path) as image:
+            for frame in animation_frames(image, width):
+                if writer is None:
+                    writer = animfile.AnimationWriter(path, frame.width, frame.height, interval)
+                    rows = [''] * frame.height
+                for row, column, text in frame.spans:
+                    rows[row] = rows[row][:column] + text + rows[row][column + len(text):]
+                writer.add_frame(rows, frame.duration)
+    finally:
+        if writer is not None:
+            writer.close()
+    return len(writer) if writer is not None else 0
+
+
+def play(image_path, width=100, loop=False, out=None, fps=None, start=0):
+    """Play an animated image or animation file in the terminal, redrawing only changed cells
+
+    Frames follow the file's own timing, or ``fps`` frames per second when
+    given. Frames that are already late are converted but not drawn.
+    Animation files (see ``animfile``) play at their own size from frame
+    ``start``; other images always start at the first frame, and a
+    ``start`` raises ValueError. Returns the FramePacer, whose counters give
+    the frames shown and dropped.
+    """
+    import animfile
+    import terminal
+    pacer = terminal.FramePacer(fps)
+    if animfile.is_animation_file(image_path):
+        with animfile.AnimationFile(image_path) as frames:
+            if start and not 0 <= start < len(frames):
+                raise ValueError(f"Start frame {start} out of range (0-{len(frames) - 1})")
+            with terminal.TerminalRenderer(out) as screen:
+                while True:
+                    for duration, frame in frames.frames(start):
+                        screen.set_frame(frame)
+                        if pacer.tick(None if fps else duration / 1000):
+                            screen.present()
+                    screen.present()
+                    if not loop:
+                        break
+                    start = 0
+        return pacer
+    if start:
+        raise ValueError(f"{image_path} is not an animation file; only .afa files can start at a frame")
+    with Image.open(image_path) as image, terminal.TerminalRenderer(out) as screen:
+        while True:
+            for frame in animation_frames(image, width):
+                screen.update(frame.spans)
+                if pacer.tick(None if fps else frame.duration / 1000):
+                    screen.present()
+            # Draw the final frame even if it was dropped
+            screen.present()
+            if not loop:
+                break
+    return pacer
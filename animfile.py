@@ -0,0 +1,334 @@
+"""
+Animfile module for AsciiForge - Compact, seekable ASCII animation files
+
+An animation file stores frames of a fixed character grid as edits, not as
+text. A keyframe holds every cell; the frames after it hold only the runs
+of cells that changed since the previous frame. Cell text is run-length
+encoded, so blank or flat areas cost a few bytes in either case:
+
+    header | frame ... frame | index | footer
+
+The index has one fixed-size entry per frame (offset, length, duration and
+the frame's keyframe), so finding a frame is a single lookup. Reaching it
+replays at most ``keyframe_interval - 1`` deltas from that keyframe, which
+makes any position start instantly. Frames are written as they are added
+and the index goes at the end when the writer is closed; readers
+memory-map the file and decode frames on demand.
+
+A frame payload is a sequence of edits, each ``varint skip, varint cells``
+(unchanged cells before the edit, and cells it covers) followed by
+segments: ``varint bytes << 1`` and that many bytes of UTF-8 text, or
+``varint count << 1 | 1, varint code point`` for a run of one character.
+"""
+import mmap
+import os
+import re
+import struct
+from collections import namedtuple
+
+import terminal
+
+
+MAGIC = b'AFANI\0'
+VERSION = 1
+# magic, version, columns, rows
+HEADER = struct.Struct('<6sHII')
+# offset, length, duration (ms), index of the frame's keyframe
+ENTRY = struct.Struct('<QIII')
+# index offset, frame count
+FOOTER = struct.Struct('<QI4s')
+FOOTER_MAGIC = b'AFAF'
+
+ANIMATION_SUFFIX = '.afa'
+
+KEYFRAME_INTERVAL = 60
+DEFAULT_DURATION = 100  # ms
+# Runs shorter than this are cheaper as literal text
+MIN_RUN = 4
+_RUNS = re.compile(r'(.)\1{%d,}' % (MIN_RUN - 1), re.S)
+
+FrameInfo = namedtuple('FrameInfo', ['index', 'duration', 'keyframe', 'size'])
+
+
+class AnimationFileError(ValueError):
+    """Raised for files that are not valid animation files"""
+
+
+def _put_varint(out, value):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _put_literal(out, text):
+    data = text.encode('utf-8')
+    _put_varint(out, len(data) << 1)
+    out += data
+
+
+def encode_edits(edits):
+    """Encode (skip, text) edits as a frame payload"""
+    out = bytearray()
+    for skip, text in edits:
+        _put_varint(out, skip)
+        _put_varint(out, len(text))
+        pos = 0
+        for match in _RUNS.finditer(text):
+            if match.start() > pos:
+                _put_literal(out, text[pos:match.start()])
+            _put_varint(out, (match.end() - match.start()) << 1 | 1)
+            _put_varint(out, ord(match.group(1)))
+            pos = match.end()
+        if pos < len(text):
+            _put_literal(out, text[pos:])
+    return bytes(out)
+
+
+def decode_edits(data):
+    """Decode a frame payload back into (skip, text) edits
+
+    Raises AnimationFileError for a truncated or corrupt payload.
+    """
+    try:
+        return _decode_edits(data)
+    except (IndexError, ValueError, OverflowError):
+        # Reading past the end, bad UTF-8 or a code point out of range
+        raise AnimationFileError("Frame data is truncated or corrupt") from None
+
+
+def _decode_edits(data):
+    edits = []
+    pos = 0
+    while pos < len(data):
+        skip, pos = _get_varint(data, pos)
+        cells, pos = _get_varint(data, pos)
+        parts = []
+        filled = 0
+        while filled < cells:
+            header, pos = _get_varint(data, pos)
+            if header & 1:
+                code, pos = _get_varint(data, pos)
+                parts.append(chr(code) * (header >> 1))
+                filled += header >> 1
+            else:
+                end = pos + (header >> 1)
+                text = data[pos:end].decode('utf-8')
+                parts.append(text)
+                filled += len(text)
+                pos = end
+        edits.append((skip, ''.join(parts)))
+    return edits
+
+
+def apply_edits(cells, edits):
+    """Apply (skip, text) edits to a flat string of cells"""
+    parts = []
+    pos = 0
+    for skip, text in edits:
+        start = pos + skip
+        parts.append(cells[pos:start])
+        parts.append(text)
+        pos = start + len(text)
+    parts.append(cells[pos:])
+    return ''.join(parts)
+
+
+class AnimationWriter:
+    """Write frames of a ``columns`` x ``rows`` grid to an animation file as they come
+
+    ``target`` is a path or a binary file object, which need not be
+    seekable. Frames are strings of rows or lists of rows; shorter rows and
+    missing rows are padded with spaces.
+    """
+
+    def __init__(self, target, columns, rows, keyframe_interval=KEYFRAME_INTERVAL):
+        if columns <= 0 or rows <= 0:
+            raise ValueError(f"Invalid animation size: {columns}x{rows}")
+        self.columns = columns
+        self.rows = rows
+        self.keyframe_interval = max(1, keyframe_interval)
+        self._owned = isinstance(target, (str, os.PathLike))
+        self._file = open(target, 'wb') if self._owned else target
+        self._entries = []
+        self._previous = None
+        self._keyframe = 0
+        self._offset = self._write(HEADER.pack(MAGIC, VERSION, columns, rows))
+
+    def _write(self, data):
+        self._file.write(data)
+        return len(data)
+
+    def _grid(self, frame):
+        lines = frame.split('\n') if isinstance(frame, str) else list(frame)
+        if lines and not lines[-1]:
+            lines.pop()  # trailing newline
+        if len(lines) > self.rows or any(len(line) > self.columns for line in lines):
+            raise ValueError(f"Frame does not fit a {self.columns}x{self.rows} animation")
+        lines += [''] * (self.rows - len(lines))
+        return [line.ljust(self.columns) for line in lines]
+
+    def add_frame(self, frame, duration=DEFAULT_DURATION):
+        """Append one frame shown for ``duration`` ms"""
+        grid = self._grid(frame)
+        index = len(self._entries)
+        edits = None
+        if self._previous is not None and index - self._keyframe < self.keyframe_interval:
+            edits, changed, end = [], 0, 0
+            for y, (old, new) in enumerate(zip(self._previous, grid)):
+                if old == new:
+                    continue
+                for column, text in terminal.changed_runs(old, new):
+                    start = y * self.columns + column
+                    edits.append((start - end, text))
+                    end = start + len(text)
+                    changed += len(text)
+            if changed * 2 > self.columns * self.rows:
+                edits = None  # a keyframe costs about the same
+        if edits is None:
+            self._keyframe = index
+            edits = [(0, ''.join(grid))]
+        payload = encode_edits(edits)
+        self._entries.append(ENTRY.pack(self._offset, len(payload), int(duration), self._keyframe))
+        self._offset += self._write(payload)
+        self._previous = grid
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        """Write the frame index and footer; the file is unreadable before this"""
+        if self._file is None:
+            return
+        try:
+            index_offset = self._offset
+            self._write(b''.join(self._entries))
+            self._write(FOOTER.pack(index_offset, len(self._entries), FOOTER_MAGIC))
+            self._file.flush()
+        finally:
+            if self._owned:
+                self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AnimationFile:
+    """Random-access reader for a memory-mapped animation file
+
+    Indexing returns a frame as rows joined by newlines. Reading frames in
+    order applies one delta per frame; any other frame is rebuilt from its
+    keyframe.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < HEADER.size + FOOTER.size:
+                raise AnimationFileError(f"{path}: file too small to be an animation")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.columns, self.rows = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise AnimationFileError(f"{path}: not an AsciiForge animation (or unsupported version)")
+            self._index, self._count, footer_magic = FOOTER.unpack_from(self._map, size - FOOTER.size)
+            if footer_magic != FOOTER_MAGIC:
+                raise AnimationFileError(f"{path}: missing frame index (truncated or still being written)")
+            if self._index + self._count * ENTRY.size != size - FOOTER.size:
+                raise AnimationFileError(f"{path}: corrupt frame index")
+        except BaseException:
+            self.close()
+            raise
+        self._cached = (None, None)  # last decoded (index, cells)
+
+    def close(self):
+        """Release the memory map and file handle"""
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _entry(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(f"Frame {index} out of range (0-{self._count - 1})")
+        return ENTRY.unpack_from(self._map, self._index + index * ENTRY.size)
+
+    def info(self, index):
+        """Return the FrameInfo of a frame without decoding it"""
+        _, length, duration, keyframe = self._entry(index)
+        return FrameInfo(index, duration, keyframe, length)
+
+    def _edits(self, index):
+        offset, length, _, _ = self._entry(index)
+        try:
+            return decode_edits(self._map[offset:offset + length])
+        except AnimationFileError as e:
+            raise AnimationFileError(f"{self.path}: frame {index}: {e}") from None
+
+    def cells(self, index):
+        """Return a frame as one flat string of ``columns * rows`` cells"""
+        if index < 0:
+            index += self._count
+        keyframe = self._entry(index)[3]
+        done, cells = self._cached
+        if done is None or not keyframe <= done <= index:
+            done, cells = keyframe, ''
+            cells = apply_edits(cells, self._edits(keyframe))
+        for step in range(done + 1, index + 1):
+            cells = apply_edits(cells, self._edits(step))
+        if len(cells) != self.columns * self.rows:
+            raise AnimationFileError(f"{self.path}: frame {index} is corrupt")
+        self._cached = (index, cells)
+        return cells
+
+    def __getitem__(self, index):
+        cells = self.cells(index)
+        return '\n'.join([cells[i:i + self.columns] for i in range(0, len(cells), self.columns)])
+
+    def frames(self, start=0):
+        """Yield (duration, frame) pairs lazily from frame ``start`` on"""
+        for index in range(start, self._count):
+            yield self._entry(index)[2], self[index]
+
+    def __iter__(self):
+        return (frame for _, frame in self.frames())
+
+    def duration(self):
+        """Total running time in ms"""
+        return sum(self._entry(index)[2] for index in range(self._count))
+
+
+def is_animation_file(path):
+    """Whether ``path`` starts with the animation file magic"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
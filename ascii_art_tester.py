@@ -4,9 +4,13 @@ ASCII Art Tester - A simple tool for testing and displaying ASCII art
 """
 
 import sys
-from PIL import Image
+import json
 import argparse
 import example
+import converter
+import cache
+import instrument
+import output
 
 # Try to import tkinter for a file-selection dialog. Tkinter is a system package
 # (not installable via pip). We handle its absence gracefully.
@@ -18,47 +22,58 @@ except Exception:
     HAS_TK = False
 
 
-ASCII_CHARS = ['@', '#', 'S', '%', '?', '*', '+', ';', ':', ',', '.']
+def image_to_ascii(image_path, width=100, use_cache=True, color_mode=None, color_bits=None, dither=None,
+                   shape=False, font=None, render=None, threshold=None, invert=False):
+    """Convert image to ASCII art, in color if ``color_mode`` is set
 
-
-def resize_image(image, new_width=100):
-    """Resize image maintaining aspect ratio"""
-    width, height = image.size
-    aspect_ratio = height / width
-    new_height = int(new_width * aspect_ratio * 0.55)  # 0.55 to adjust for character height
-    return image.resize((new_width, new_height))
-
-
-def grayscale(image):
-    """Convert image to grayscale"""
-    return image.convert('L')
-
-
-def pixels_to_ascii(image):
-    """Convert pixels to ASCII characters"""
-    pixels = image.getdata()
-    ascii_str = ''
-    for pixel in pixels:
-        ascii_str += ASCII_CHARS[pixel // 25]
-    return ascii_str
+    With ``shape`` characters are matched to the image by glyph shape using
+    ``font`` (a font file, default: a system monospace font). ``render``
+    selects a Braille or half-block renderer instead of the character ramp.
+    """
+    try:
+        if render:
+            import subpixel
+            return subpixel.convert_file(image_path, width, render, threshold or subpixel.DEFAULT_THRESHOLD,
+                                         invert, dither)
+        if shape:
+            import glyphs
+            return glyphs.convert_file(image_path, width, font, invert=invert)
+        if color_mode:
+            import color
+            return color.convert_file(image_path, width, color_mode, bits=color_bits or color.DEFAULT_BITS,
+                                      dither=dither)
+        if use_cache:
+            return cache.convert_file(image_path, width, dither=dither)
+        return converter.convert_file(image_path, width, dither=dither)
+    except Exception as e:
+        print(f"Error opening image: {e}")
+        return None
 
 
-def image_to_ascii(image_path, width=100):
-    """Convert image to ASCII art"""
+def stream_image_to_ascii(image_path, width=100):
+    """Convert a large image in strips, printing rows as they are produced"""
+    import strips
+    rows = []
+    print("\n" + "="*80)
     try:
-        image = Image.open(image_path)
+        for row in strips.iter_ascii_rows(image_path, width):
+            print(row)
+            rows.append(row)
     except Exception as e:
-        print(f"Error opening image: {e}")
+        print(f"Error converting image: {e}")
         return None
-    
-    image = resize_image(image, width)
-    image = grayscale(image)
-    
-    ascii_str = pixels_to_ascii(image)
-    img_width = image.width
-    
-    ascii_art = '\n'.join([ascii_str[i:i+img_width] for i in range(0, len(ascii_str), img_width)])
-    return ascii_art
+    print("="*80 + "\n")
+    return '\n'.join(rows)
+
+
+def save_prompt(ascii_art, color_mode=None):
+    """Offer to save converted art to a file"""
+    save = input("Save to file? (y/n): ")
+    if save.lower() == 'y':
+        default = "output.html" if color_mode == 'html' else "output.txt"
+        filename = input(f"Enter filename (default: {default}): ") or default
+        converter.save_ascii(filename, ascii_art)
+        print(f"Saved to {filename}")
 
 
 def display_ascii_art(art):
@@ -74,6 +89,22 @@ def test_ascii_string(text):
 
 
 def main():
+    args = parse_args()
+    if not args.profile:
+        sys.exit(run(args))
+    with instrument.capture(profile=args.profile_cpu, memory=args.profile_memory) as trace:
+        status = run(args)
+    if args.profile == '-':
+        print(trace.to_json(indent=2))
+    else:
+        with open(args.profile, 'w') as f:
+            f.write(trace.to_json(indent=2))
+        print(f"Profile trace written to {args.profile}")
+    sys.exit(status)
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
     parser = argparse.ArgumentParser(description='Test ASCII art')
     parser.add_argument('-f', '--file', help='Image file to convert to ASCII')
     parser.add_argument('-w', '--width', type=int, default=100, help='Width of ASCII output (default: 100)')
@@ -82,17 +113,140 @@ def main():
     parser.add_argument('-c', '--canvas', help='Display ASCII art from canvas by name')
     parser.add_argument('-l', '--list', action='store_true', help='List all available canvas art')
     parser.add_argument('-a', '--all', action='store_true', help='Display all canvas art')
+    parser.add_argument('--search', metavar='QUERY',
+                        help="Search canvas art by name, tag:, w<N/h>N filters or \"text\" in the art")
+    parser.add_argument('--limit', type=int, default=20, help='Maximum search results (default: 20)')
     parser.add_argument('-g', '--gui', action='store_true', help='Open a file dialog to choose an image to convert')
+    parser.add_argument('--color', choices=('ansi', 'ansi256', 'html'),
+                        help='Colored output: 24-bit ANSI, 256-color ANSI or HTML')
+    parser.add_argument('--color-bits', type=int, choices=range(1, 9), metavar='{1..8}',
+                        help='Bits per channel kept by --color ansi/html; fewer bits give longer runs (default: 5)')
+    parser.add_argument('--dither', choices=converter.DITHER_MODES,
+                        help='Dither onto the character ramp to avoid banding on smooth gradients')
+    parser.add_argument('--shape', action='store_true',
+                        help='Match characters to edges and lines by glyph shape instead of brightness')
+    parser.add_argument('--font', metavar='FILE', help='Monospace font whose glyphs --shape matches against')
+    parser.add_argument('--render', choices=('braille', 'halfblock'),
+                        help='Pack 2x4 (braille) or 1x2 (halfblock) sub-pixels into each character')
+    parser.add_argument('--threshold', type=int, choices=range(1, 256), metavar='{1..255}',
+                        help='Luminance below which --render draws a sub-pixel (default: 128)')
+    parser.add_argument('--invert', action='store_true',
+                        help='With --render or --shape, draw light pixels instead of dark ones')
+    parser.add_argument('--save', metavar='FILE',
+                        help="With -f, write the art to FILE instead of displaying it ('-' for stdout; "
+                             ".gz, .bz2, .xz and .zst are compressed)")
+    parser.add_argument('--stream', action='store_true',
+                        help='With -f, decode large images in strips with bounded memory and print rows as ready')
+    parser.add_argument('--animate', metavar='FILE', help='Play an animated GIF as ASCII in the terminal')
+    parser.add_argument('--loop', action='store_true', help='Loop the animation until interrupted')
+    parser.add_argument('--record', metavar='FILE',
+                        help='With --animate, save the converted frames to an .afa animation file instead of playing')
+    parser.add_argument('--start', type=int, default=0, metavar='FRAME',
+                        help='Start playing an .afa animation file at this frame')
+    parser.add_argument('--raw', metavar='WxH',
+                        help='Convert raw video frames of this size from stdin (e.g. ffmpeg -f rawvideo -)')
+    parser.add_argument('--raw-input', metavar='FILE', default='-',
+                        help="File or FIFO to read --raw frames from (default: '-' for stdin)")
+    parser.add_argument('--pix-fmt', choices=('gray', 'rgb24', 'rgb0'), default='gray',
+                        help='Pixel format of --raw frames (default: gray)')
+    parser.add_argument('--fps', type=float,
+                        help="Play --animate at a fixed frame rate instead of the file's own timing, "
+                             "or pace --raw to this rate")
+    parser.add_argument('-b', '--batch', nargs='+', metavar='INPUT',
+                        help='Convert image files, directories or glob patterns without prompting')
+    parser.add_argument('-o', '--output-dir', help='Directory for batch outputs (default: current directory)')
+    parser.add_argument('--bundle', help='Write batch outputs to a single .jsonl or .tar file instead')
+    parser.add_argument('-j', '--jobs', type=int, help='Number of batch worker processes (default: CPU count)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the conversion cache')
+    parser.add_argument('--cache-stats', action='store_true', help='Print conversion cache statistics as JSON')
+    parser.add_argument('--clear-cache', action='store_true', help='Delete every cached conversion')
+    parser.add_argument('--profile', metavar='FILE',
+                        help="Write a JSON trace of per-stage timings to FILE ('-' for stdout)")
+    parser.add_argument('--profile-cpu', action='store_true', help='Include cProfile statistics in the trace')
+    parser.add_argument('--profile-memory', action='store_true', help='Include tracemalloc statistics in the trace')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only report batch failures')
+    
+    args = parser.parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        parser.error(f"--jobs must be at least 1, got {args.jobs}")
+    if args.start and args.record:
+        parser.error("--start only applies to playing .afa animation files, not to --record")
+    if args.render and args.dither:
+        import subpixel
+        if args.dither not in subpixel.DITHER_MODES:
+            parser.error(f"--dither {args.dither} is not supported with --render "
+                         f"(choose from {', '.join(subpixel.DITHER_MODES)})")
+    args.print_help = parser.print_help
+    return args
+
+
+def run(args):
+    """Run the command selected by the parsed arguments; returns an exit status"""
+    use_cache = not args.no_cache
+    
+    if args.clear_cache:
+        cache.default_cache().clear()
+        print(f"Cleared cache at {cache.default_cache().directory}")
     
-    args = parser.parse_args()
+    if args.batch:
+        import batch
+        status = batch.main(args.batch, args.width, args.output_dir, args.bundle, args.jobs, args.quiet, use_cache)
+        if args.cache_stats:
+            print(json.dumps(cache.default_cache().stats(), indent=2))
+        return status
     
-    if args.list:
+    elif args.animate:
+        import animation
+        try:
+            if args.record:
+                count = animation.save(args.animate, args.record, args.width)
+                print(f"Saved {count} frames to {args.record}")
+            else:
+                pacer = animation.play(args.animate, args.width, args.loop, fps=args.fps, start=args.start)
+                print(f"Shown {pacer.shown} frames, dropped {pacer.dropped}")
+        except KeyboardInterrupt:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    
+    elif args.raw:
+        import rawvideo
+        try:
+            size = rawvideo.parse_size(args.raw)
+            if args.raw_input == '-':
+                stats = rawvideo.play(sys.stdin.buffer, size, args.width, args.pix_fmt, args.fps)
+            else:
+                with open(args.raw_input, 'rb') as stream:
+                    stats = rawvideo.play(stream, size, args.width, args.pix_fmt, args.fps)
+        except KeyboardInterrupt:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        else:
+            summary = stats.as_dict()
+            print(f"Read {summary['frames']} frames: converted {summary['converted']}, "
+                  f"skipped {summary['skipped']}, overruns {summary['overruns']}, "
+                  f"{summary['ms_per_frame']} ms per frame", file=sys.stderr)
+    
+    elif args.list:
         print("\nAvailable ASCII art in canvas:")
         for name in example.list_art():
             print(f"  - {name}")
         print(f"\nTotal: {len(example.list_art())} pieces")
         print("\nUse: python ascii_art_tester.py -c <name>")
     
+    elif args.search is not None:
+        import search
+        results = search.search(args.search, args.limit)
+        print(f"\nSearch results for '{args.search}':")
+        for result in results:
+            print(f"  - {result.name:<24} {result.width:>4}x{result.height:<4} {', '.join(result.tags)}")
+        print(f"\n{len(results)} result(s)")
+        if results:
+            print("\nUse: python ascii_art_tester.py -c <name>")
+    
     elif args.all:
         all_art = example.get_all_art()
         for name, art in all_art.items():
@@ -121,19 +275,46 @@ def main():
         print("\nSample ASCII Art - Cat:")
         display_ascii_art(sample_art)
     
+    elif args.file and args.save:
+        try:
+            if args.stream:
+                import strips
+                output.write_rows(args.save, strips.iter_ascii_rows(args.file, args.width))
+            elif args.color or args.shape or args.render:
+                ascii_art = image_to_ascii(args.file, args.width, use_cache, args.color, args.color_bits,
+                                           args.dither, args.shape, args.font, args.render, args.threshold,
+                                           args.invert)
+                if ascii_art is None:
+                    return 1
+                converter.save_ascii(args.save, ascii_art)
+            else:
+                output.save_file(args.file, args.save, args.width, dither=args.dither)
+        except Exception as e:
+            print(f"Error converting image: {e}", file=sys.stderr)
+            return 1
+        if args.save != '-':
+            print(f"Saved to {args.save}")
+    
     elif args.file:
         print(f"Converting image: {args.file}")
-        ascii_art = image_to_ascii(args.file, args.width)
+        if args.stream:
+            if args.color or args.dither or args.shape or args.render:
+                print("Note: --color, --dither, --shape and --render are not supported with --stream; "
+                      "writing plain rows")
+            ascii_art = stream_image_to_ascii(args.file, args.width)
+        else:
+            if args.render and (args.color or args.shape):
+                print("Note: --color and --shape are ignored with --render")
+            elif args.shape and (args.color or args.dither):
+                print("Note: --color and --dither are ignored with --shape")
+            ascii_art = image_to_ascii(args.file, args.width, use_cache, args.color, args.color_bits,
+                                       args.dither, args.shape, args.font, args.render, args.threshold,
+                                       args.invert)
+            if ascii_art:
+                display_ascii_art(ascii_art)
         if ascii_art:
-            display_ascii_art(ascii_art)
-            
             # Option to save
-            save = input("Save to file? (y/n): ")
-            if save.lower() == 'y':
-                filename = input("Enter filename (default: output.txt): ") or "output.txt"
-                with open(filename, 'w') as f:
-                    f.write(ascii_art)
-                print(f"Saved to {filename}")
+            save_prompt(ascii_art, None if args.shape or args.render else args.color)
 
     elif args.gui:
         if not HAS_TK:
@@ -148,29 +329,46 @@ def main():
             root.destroy()
             if image_path:
                 print(f"Converting image: {image_path}")
-                ascii_art = image_to_ascii(image_path, args.width)
+                ascii_art = image_to_ascii(image_path, args.width, use_cache, args.color, args.color_bits,
+                                           args.dither, args.shape, args.font, args.render, args.threshold,
+                                           args.invert)
                 if ascii_art:
                     display_ascii_art(ascii_art)
-                    save = input("Save to file? (y/n): ")
-                    if save.lower() == 'y':
-                        filename = input("Enter filename (default: output.txt): ") or "output.txt"
-                        with open(filename, 'w') as f:
-                            f.write(ascii_art)
-                        print(f"Saved to {filename}")
+                    save_prompt(ascii_art, None if args.shape or args.render else args.color)
     
     elif args.text:
         display_ascii_art(args.text)
     
+    elif args.cache_stats or args.clear_cache:
+        pass
+    
     else:
-        parser.print_help()
+        args.print_help()
         print("\nExamples:")
         print("  python ascii_art_tester.py -l                    # List all canvas art")
         print("  python ascii_art_tester.py -c cat                # Display 'cat' from canvas")
         print("  python ascii_art_tester.py -a                    # Display all canvas art")
+        print("  python ascii_art_tester.py --search 'anim w<20'  # Search canvas art")
         print("  python ascii_art_tester.py -s                    # Show sample ASCII art")
         print("  python ascii_art_tester.py -f image.jpg          # Convert image to ASCII")
         print("  python ascii_art_tester.py -f image.jpg -w 150   # Convert with custom width")
+        print("  python ascii_art_tester.py -f image.jpg --color ansi  # Truecolor terminal output")
+        print("  python ascii_art_tester.py -f image.jpg --dither atkinson  # Smoother gradients")
+        print("  python ascii_art_tester.py -f drawing.png --shape  # Match lines and edges")
+        print("  python ascii_art_tester.py -f image.jpg --render braille  # 8x the detail")
         print("  python ascii_art_tester.py -t 'Hello World'      # Display text")
+        print("  python ascii_art_tester.py --cache-stats         # Show conversion cache statistics")
+        print("  python ascii_art_tester.py -f image.jpg --no-cache --profile trace.json")
+        print("  python ascii_art_tester.py -f huge.png --stream  # Bounded-memory conversion")
+        print("  python ascii_art_tester.py -f huge.png -w 10000 --save art.txt.gz  # Write straight to a file")
+        print("  python ascii_art_tester.py --animate anim.gif     # Play an animated GIF")
+        print("  python ascii_art_tester.py --animate anim.gif --record anim.afa  # Save as an animation file")
+        print("  ffmpeg -i clip.mp4 -f rawvideo -pix_fmt gray - | python ascii_art_tester.py --raw 1920x1080")
+        print("  python ascii_art_tester.py -b photos/ -o out/    # Batch convert a directory")
+        print("  python ascii_art_tester.py -b '*.png' --bundle all.jsonl")
+    
+    if args.cache_stats and not args.batch:
+        print(json.dumps(cache.default_cache().stats(), indent=2))
 
 
 if __name__ == "__main__":
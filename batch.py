@@ -0,0 +1,215 @@
+"""
+Batch module for AsciiForge - Parallel conversion of many images
+"""
+import glob
+import io
+import json
+import os
+import re
+import sys
+import tarfile
+import time
+from collections import namedtuple
+from multiprocessing import Pool
+
+import cache
+import converter
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+# Outcome of one conversion; ``output`` is the written file or the ASCII art
+# and ``counts`` the worker's cache counters for this job
+BatchResult = namedtuple('BatchResult', ['path', 'name', 'output', 'error', 'cached', 'counts'])
+
+_MAGIC = re.compile(r'[*?[]')
+
+
+def _glob_root(pattern):
+    """The leading directories of a glob pattern that contain no wildcards"""
+    parts = pattern.replace(os.sep, '/').split('/')
+    fixed = []
+    for part in parts[:-1]:
+        if _MAGIC.search(part):
+            break
+        fixed.append(part)
+    return '/'.join(fixed) or ('/' if pattern.startswith(('/', os.sep)) else '.')
+
+
+def collect_inputs(patterns):
+    """Expand files, directories and glob patterns into (path, name) pairs
+
+    ``name`` is the path relative to the directory it was found in (for a
+    glob, the pattern's leading directories without wildcards), so that
+    outputs for nested directories do not collide. Raises ValueError if
+    two inputs would still be written to the same output name.
+    """
+    inputs = []
+    seen = set()
+
+    def add(path, name):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            inputs.append((path, name))
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for filename in sorted(files):
+                    if filename.lower().endswith(IMAGE_EXTENSIONS):
+                        path = os.path.join(root, filename)
+                        add(path, os.path.relpath(path, pattern))
+        elif _MAGIC.search(pattern):
+            root = _glob_root(pattern)
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if not os.path.isdir(path):
+                    add(path, os.path.relpath(path, root))
+        else:
+            # Missing files are kept so they are reported as failures
+            add(pattern, os.path.basename(pattern))
+
+    outputs = {}
+    for path, name in inputs:
+        other = outputs.setdefault(os.path.normcase(output_name(name)), path)
+        if other != path:
+            raise ValueError(f"{other} and {path} would both be written to {output_name(name)}")
+    return inputs
+
+
+def output_name(name):
+    """Return the text file name used for an input's ASCII art"""
+    return os.path.splitext(name)[0] + '.txt'
+
+
+def _convert(job):
+    """Convert a single image in a worker process"""
+    path, name, width, output_dir, use_cache = job
+    store = cache.default_cache() if use_cache else None
+    before = store.counters() if store else {}
+    cached = False
+
+    def result(output, error=None):
+        counts = {key: value - before[key] for key, value in store.counters().items()} if store else {}
+        return BatchResult(path, name, output, error, cached, counts)
+
+    try:
+        if store:
+            hits = store.hits
+            art = cache.convert_file(path, width, cache=store)
+            cached = store.hits > hits
+        else:
+            art = converter.convert_file(path, width)
+        if output_dir is None:
+            return result(art)
+        target = os.path.join(output_dir, output_name(name))
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        converter.save_ascii(target, art)
+        return result(target)
+    except Exception as e:
+        return result(None, f"{type(e).__name__}: {e}")
+
+
+class BundleWriter:
+    """Write batch results into a single JSONL or tar bundle"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.is_tar = filename.endswith(('.tar', '.tar.gz', '.tgz'))
+        if self.is_tar:
+            self.archive = tarfile.open(filename, 'w:gz' if filename.endswith('gz') else 'w')
+        else:
+            self.archive = open(filename, 'w', encoding='utf-8')
+
+    def write(self, result):
+        """Append one successful conversion to the bundle"""
+        if self.is_tar:
+            data = result.output.encode('utf-8')
+            info = tarfile.TarInfo(output_name(result.name))
+            info.size = len(data)
+            info.mtime = time.time()
+            self.archive.addfile(info, io.BytesIO(data))
+        else:
+            record = {'path': result.path, 'name': result.name, 'ascii': result.output}
+            self.archive.write(json.dumps(record) + '\n')
+
+    def close(self):
+        """Close the bundle file"""
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_batch(inputs, width=100, output_dir=None, bundle=None, jobs=None, progress=None,
+              use_cache=True):
+    """Convert many images in a process pool
+
+    Exactly one of ``output_dir`` (one text file per input) or ``bundle``
+    (a single ``.jsonl`` or ``.tar`` file) should be given. Failures are
+    collected instead of aborting the run. ``progress`` is called with each
+    ``BatchResult`` as it completes. With ``use_cache`` every worker reads
+    and writes the shared on-disk conversion cache.
+
+    Returns a tuple of (number converted, number served from the cache,
+    list of failed BatchResults).
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    elif jobs < 1:
+        raise ValueError(f"jobs must be at least 1, got {jobs}")
+    # Workers write their own files; results only travel back for bundles
+    write_dir = None if bundle else (output_dir or '.')
+    tasks = [(path, name, width, write_dir, use_cache) for path, name in inputs]
+    chunksize = max(1, min(64, len(tasks) // (jobs * 4)))
+
+    converted = 0
+    cached = 0
+    failures = []
+    writer = BundleWriter(bundle) if bundle else None
+    try:
+        with Pool(min(jobs, max(1, len(tasks)))) as pool:
+            for result in pool.imap_unordered(_convert, tasks, chunksize):
+                # Workers exit without flushing, so their cache counts are kept here
+                if result.counts:
+                    cache.default_cache().add_counters(result.counts)
+                if result.error:
+                    failures.append(result)
+                else:
+                    if writer:
+                        writer.write(result)
+                    converted += 1
+                    cached += result.cached
+                if progress:
+                    progress(result)
+    finally:
+        if writer:
+            writer.close()
+    return converted, cached, failures
+
+
+def main(patterns, width=100, output_dir=None, bundle=None, jobs=None, quiet=False, use_cache=True):
+    """Command-line entry point for batch conversion; returns an exit code"""
+    try:
+        inputs = collect_inputs(patterns)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if not inputs:
+        print("No input images found.", file=sys.stderr)
+        return 1
+
+    def report(result):
+        if result.error:
+            print(f"FAILED {result.path}: {result.error}", file=sys.stderr)
+        elif not quiet:
+            print(f"ok     {result.path}")
+
+    print(f"Converting {len(inputs)} image(s) with {jobs if jobs is not None else os.cpu_count() or 1} worker(s)...")
+    converted, cached, failures = run_batch(inputs, width, output_dir, bundle, jobs, report, use_cache)
+    print(f"\nConverted: {converted} ({cached} from cache)  Failed: {len(failures)}")
+    return 1 if failures else 0
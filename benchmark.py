@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Timing suite for AsciiForge's conversion and canvas hot paths
+
+Inputs are generated deterministically (gradients, seeded noise and a
+synthetic "photo"), so results are comparable between runs and machines.
+Each pipeline is timed stage by stage and the results are written as JSON.
+A previous run can be passed with --baseline to flag regressions.
+
+    python benchmark.py -o bench.json
+    python benchmark.py --baseline bench.json --threshold 0.15
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import PIL
+from PIL import Image
+
+import cache
+import color
+import converter
+import glyphs
+import output
+import subpixel
+
+try:
+    import canvas
+    HAS_CANVAS = True
+except Exception:  # tkinter missing
+    HAS_CANVAS = False
+
+
+DEFAULT_SIZES = (100, 500, 2000)
+FULL_SIZES = (100, 500, 2000, 20000)
+KINDS = ('gradient', 'noise', 'photo')
+OUTPUT_WIDTH = 100
+NOISE_TILE = 512
+SEED = 1234
+
+
+def make_image(kind, width):
+    """Build a deterministic RGB test image ``width`` pixels wide (4:3)"""
+    size = (width, width * 3 // 4)
+    if kind == 'gradient':
+        horizontal = Image.linear_gradient('L').rotate(90).resize(size)
+        vertical = Image.linear_gradient('L').resize(size)
+        return Image.merge('RGB', (horizontal, vertical, Image.new('L', size, 128)))
+    if kind == 'noise':
+        rng = random.Random(SEED)
+        tile = Image.frombytes('RGB', (NOISE_TILE, NOISE_TILE),
+                               bytes(rng.getrandbits(8) for _ in range(NOISE_TILE * NOISE_TILE * 3)))
+        image = Image.new('RGB', size)
+        for y in range(0, size[1], NOISE_TILE):
+            for x in range(0, size[0], NOISE_TILE):
+                image.paste(tile, (x, y))
+        return image
+    if kind == 'photo':
+        # Smooth regions plus fine detail, rendered small and scaled up
+        small = (min(width, 1024), min(width, 1024) * 3 // 4)
+        detail = Image.effect_mandelbrot(small, (-2.0, -1.2, 1.0, 1.2), 64).resize(size, Image.BICUBIC)
+        return Image.merge('RGB', (detail, Image.linear_gradient('L').resize(size),
+                                   Image.radial_gradient('L').resize(size)))
+    raise ValueError(f"Unknown input kind: {kind}")
+
+
+def timed(func, repeat):
+    """Run ``func`` ``repeat`` times; return (best, median, last result)"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times), result
+
+
+class Recorder:
+    """Collects named timings"""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+
+    def time(self, name, func, repeat=None):
+        best, median, result = timed(func, repeat or self.repeat)
+        self.results[name] = {'best': best, 'median': median}
+        print(f"  {name:<52} {best * 1000:10.3f} ms")
+        return result
+
+
+def bench_conversion(rec, kind, width):
+    """Time each stage of the image conversion pipelines for one input"""
+    source = make_image(kind, width)
+    encoded = io.BytesIO()
+    source.save(encoded, 'PNG', compress_level=1)
+    data = encoded.getvalue()
+
+    def decode():
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return image
+
+    prefix = f"conversion/{kind}/{width}"
+    image = rec.time(f"{prefix}/decode", decode)
+
+    # ascii_art_tester.image_to_ascii and image-to-ascii.py: resize, then grayscale
+    small = rec.time(f"{prefix}/tester/resize", lambda: converter.resize_image(image, OUTPUT_WIDTH))
+    gray = rec.time(f"{prefix}/tester/grayscale", lambda: converter.grayscale(small))
+    mapped = rec.time(f"{prefix}/tester/glyph_mapping", lambda: converter.pixels_to_ascii(gray))
+    for mode in converter.DITHER_MODES:
+        rec.time(f"{prefix}/dither/{mode}", lambda: converter.pixels_to_ascii(gray, dither=mode))
+    art = rec.time(f"{prefix}/tester/row_joining", lambda: converter.join_rows(mapped, gray.width))
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, 'out.txt')
+
+        def write():
+            with open(target, 'w', encoding='utf-8') as f:
+                f.write(art)
+
+        rec.time(f"{prefix}/tester/write", write)
+        rec.time(f"{prefix}/output/save_image", lambda: output.save_image(image, target, OUTPUT_WIDTH))
+        rec.time(f"{prefix}/tester/total", lambda: converter.image_to_ascii(decode(), OUTPUT_WIDTH))
+        for mode in color.COLOR_MODES:
+            rec.time(f"{prefix}/color/{mode}", lambda: color.image_to_color(image, OUTPUT_WIDTH, mode))
+        glyphs.glyph_matrix()
+        rec.time(f"{prefix}/glyphs/shape", lambda: glyphs.image_to_glyphs(image, OUTPUT_WIDTH))
+        for mode in subpixel.RENDER_MODES:
+            rec.time(f"{prefix}/subpixel/{mode}", lambda: subpixel.image_to_subpixels(image, OUTPUT_WIDTH, mode))
+
+        # image-to-ascii.py converts through the on-disk cache
+        path = os.path.join(tmp, 'input.png')
+        with open(path, 'wb') as f:
+            f.write(data)
+        cold = cache.ConversionCache(os.path.join(tmp, 'cold'))
+        rec.time(f"{prefix}/script/cold_cache",
+                 lambda: (cold.clear(), cache.convert_file(path, OUTPUT_WIDTH, cache=cold))[1])
+        warm = cache.ConversionCache(os.path.join(tmp, 'warm'))
+        cache.convert_file(path, OUTPUT_WIDTH, cache=warm)
+        rec.time(f"{prefix}/script/warm_cache", lambda: cache.convert_file(path, OUTPUT_WIDTH, cache=warm))
+
+    # DrawingCanvas.image_to_ascii: grayscale, then resize
+    if HAS_CANVAS:
+        gray_full = rec.time(f"{prefix}/drawing/grayscale", lambda: converter.grayscale(image))
+        rec.time(f"{prefix}/drawing/resize", lambda: converter.resize_image(gray_full, OUTPUT_WIDTH))
+        rec.time(f"{prefix}/drawing/total",
+                 lambda: canvas.drawing_to_ascii(image, OUTPUT_WIDTH))
+
+
+def bench_canvas(rec, width, height):
+    """Time the AsciiCanvas drawing primitives"""
+    prefix = f"canvas/{width}x{height}"
+    board = canvas.AsciiCanvas(width, height)
+    rng = random.Random(SEED)
+    points = [(rng.randrange(width), rng.randrange(height)) for _ in range(10000)]
+
+    def set_pixels():
+        for x, y in points:
+            board.set_pixel(x, y, '#')
+
+    def lines():
+        for i in range(0, 200, 2):
+            x1, y1 = points[i]
+            x2, y2 = points[i + 1]
+            board.draw_line(x1, y1, x2, y2, '*')
+
+    def texts():
+        for y in range(height):
+            board.draw_text(0, y, 'AsciiForge ' * (width // 11))
+
+    def render_one_change():
+        board.set_pixel(1, 1, '@')
+        return board.get_canvas()
+
+    rec.time(f"{prefix}/set_pixel_x10000", set_pixels)
+    rec.time(f"{prefix}/draw_line_x100", lines)
+    rec.time(f"{prefix}/draw_rectangle_filled",
+             lambda: board.draw_rectangle(0, 0, width - 1, height - 1, '█', fill=True))
+    rec.time(f"{prefix}/draw_rectangle_outline",
+             lambda: board.draw_rectangle(0, 0, width - 1, height - 1, '+'))
+    rec.time(f"{prefix}/draw_text_all_rows", texts)
+    rec.time(f"{prefix}/clear", board.clear)
+    rec.time(f"{prefix}/get_canvas_full", lambda: (board.clear(), board.get_canvas())[1])
+    rec.time(f"{prefix}/get_canvas_one_change", render_one_change)
+
+
+def run(sizes, kinds, repeat, canvas_sizes=((80, 24), (1000, 1000))):
+    """Run the whole suite and return the JSON-serialisable report"""
+    rec = Recorder(repeat)
+    for width in sizes:
+        for kind in kinds:
+            print(f"{kind} {width}px:")
+            bench_conversion(rec, kind, width)
+    if HAS_CANVAS:
+        for width, height in canvas_sizes:
+            print(f"AsciiCanvas {width}x{height}:")
+            bench_canvas(rec, width, height)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'repeat': repeat,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': rec.results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """Return (name, baseline, current, ratio) for timings slower than allowed"""
+    regressions = []
+    for name, current in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or previous['best'] <= 0:
+            continue
+        ratio = current['best'] / previous['best']
+        if ratio > 1 + threshold:
+            regressions.append((name, previous['best'], current['best'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark AsciiForge conversion and canvas hot paths')
+    parser.add_argument('-o', '--output', help='Write results as JSON to this file')
+    parser.add_argument('-b', '--baseline', help='Compare against a previous JSON result')
+    parser.add_argument('-t', '--threshold', type=float, default=0.10,
+                        help='Allowed slowdown against the baseline (default: 0.10 = 10%%)')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Repetitions per timing (default: 5)')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', help='Source image widths in pixels')
+    parser.add_argument('--full', action='store_true', help='Include the 20000 px inputs')
+    parser.add_argument('-k', '--kinds', nargs='+', choices=KINDS, default=list(KINDS),
+                        help='Synthetic input kinds to run')
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (FULL_SIZES if args.full else DEFAULT_SIZES)
+    if max(sizes) > 2000:
+        Image.MAX_IMAGE_PIXELS = None  # synthetic inputs are trusted
+    report = run(sizes, args.kinds, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for name, before, after, ratio in regressions:
+                print(f"  {name:<52} {before * 1000:9.3f} -> {after * 1000:9.3f} ms  (x{ratio:.2f})")
+            return 1
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
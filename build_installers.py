@@ -18,6 +18,18 @@ def build_executable():
         '--icon=icon.ico' if platform.system() == 'Windows' else '--icon=icon.icns',
         '--add-data=canvas.py;.' if platform.system() == 'Windows' else '--add-data=canvas.py:.',
         '--add-data=example.py;.' if platform.system() == 'Windows' else '--add-data=example.py:.',
+        '--add-data=converter.py;.' if platform.system() == 'Windows' else '--add-data=converter.py:.',
+        '--add-data=cache.py;.' if platform.system() == 'Windows' else '--add-data=cache.py:.',
+        '--add-data=worker.py;.' if platform.system() == 'Windows' else '--add-data=worker.py:.',
+        '--add-data=library.py;.' if platform.system() == 'Windows' else '--add-data=library.py:.',
+        '--add-data=search.py;.' if platform.system() == 'Windows' else '--add-data=search.py:.',
+        '--add-data=console.py;.' if platform.system() == 'Windows' else '--add-data=console.py:.',
+        '--add-data=color.py;.' if platform.system() == 'Windows' else '--add-data=color.py:.',
+        '--add-data=glyphs.py;.' if platform.system() == 'Windows' else '--add-data=glyphs.py:.',
+        '--add-data=subpixel.py;.' if platform.system() == 'Windows' else '--add-data=subpixel.py:.',
+        '--add-data=output.py;.' if platform.system() == 'Windows' else '--add-data=output.py:.',
+        '--add-data=files.py;.' if platform.system() == 'Windows' else '--add-data=files.py:.',
+        '--add-data=art_library.afl;.' if platform.system() == 'Windows' else '--add-data=art_library.afl:.',
         '--hidden-import=PIL',
         '--hidden-import=PIL.Image',
         '--hidden-import=PIL.ImageDraw',
@@ -0,0 +1,336 @@
+"""
+Cache module for AsciiForge - Persistent cache of conversion results
+
+Entries are keyed by a hash of the source file's content plus every
+conversion parameter, so renamed or copied images still hit and edited
+images never return stale art. Writes go to a temporary file that is
+atomically renamed into place, which lets several batch worker processes
+share one cache directory. The cache is bounded in size and evicts the
+least recently used entries first (hits refresh an entry's mtime).
+
+Hit, miss, write and eviction counters are kept across runs. Each process
+adds what it counted since its last flush as a small file in STATS_DIR,
+written atomically, and ``stats`` sums them; once STATS_MERGE_AT files have
+piled up, a flush merges them into one. A process's view of the cache size
+is refreshed from disk whenever it has written a slice of the remaining
+headroom, so concurrent workers cannot together overrun the limit unnoticed.
+"""
+import atexit
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+import PIL
+
+import converter
+import instrument
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+EVICT_TARGET = 0.9  # fraction of max_bytes to shrink to when evicting
+HASH_CHUNK = 1 << 20
+ENTRY_SUFFIX = '.txt'
+
+COUNTERS = ('hits', 'misses', 'writes', 'evictions')
+STATS_DIR = 'stats'
+STATS_SUFFIX = '.json'
+STATS_MERGE_AT = 32
+# Rescan the disk after writing 1/RESCAN_FRACTION of the headroom seen at
+# the last scan (but at least RESCAN_MIN_BYTES)
+RESCAN_FRACTION = 8
+RESCAN_MIN_BYTES = 1 << 20
+
+
+def default_cache_dir():
+    """Return the per-user cache directory, honouring ASCIIFORGE_CACHE_DIR"""
+    if os.environ.get('ASCIIFORGE_CACHE_DIR'):
+        return os.environ['ASCIIFORGE_CACHE_DIR']
+    base = (os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME')
+            or os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'asciiforge')
+
+
+def _read_stats(path):
+    """Read one counters file; unreadable or half-merged files count as empty"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            counts = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return counts if isinstance(counts, dict) else {}
+
+
+class ConversionCache:
+    """Size-bounded, content-addressed on-disk cache of ASCII conversions"""
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or default_cache_dir()
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('ASCIIFORGE_CACHE_SIZE', DEFAULT_MAX_BYTES))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._digests = {}    # (path, size, mtime) -> content digest
+        self._size = None     # estimated bytes on disk, None until scanned
+        self._unscanned = 0   # bytes this process wrote since the last scan
+        self._rescan_at = 0
+        self._flushed = dict.fromkeys(COUNTERS, 0)
+
+    def file_digest(self, path):
+        """Hash a file's content, memoized on its path, size and mtime"""
+        st = os.stat(path)
+        memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            h = hashlib.blake2b(digest_size=20)
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            self._digests[memo_key] = digest
+        return digest
+
+    def key(self, path, **params):
+        """Build a cache key from a source file and the conversion parameters"""
+        params.setdefault('aspect', converter.ASPECT_FACTOR)
+        params.setdefault('resample', 'default')
+        params['pillow'] = PIL.__version__
+        h = hashlib.blake2b(digest_size=20)
+        h.update(self.file_digest(path).encode('ascii'))
+        h.update(json.dumps(params, sort_keys=True, default=list).encode('utf-8'))
+        return h.hexdigest()
+
+    def conversion_key(self, path, width=100, chars=converter.ASCII_CHARS, dither=None):
+        """Key for the standard resize, grayscale and glyph-map conversion"""
+        params = {'dither': dither} if dither else {}
+        return self.key(path, width=width, chars=list(chars), pipeline='resize-grayscale', **params)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """Return the cached text for ``key``, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                value = f.read()
+            os.utime(path)  # refresh LRU position
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store ``value`` under ``key`` atomically, evicting old entries if needed"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = value.encode('utf-8')
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self.writes += 1
+            if self._size is not None:
+                self._size += len(data)
+                self._unscanned += len(data)
+            # Other processes write too, so refresh the size from disk now and then
+            rescan = (self._size is None or self._size > self.max_bytes
+                      or self._unscanned > self._rescan_at)
+        if rescan:
+            self.evict()
+
+    def _entries(self):
+        """Return (mtime, size, path) for every entry currently on disk"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue  # removed by another process
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Rescan the cache and delete least recently used entries over the limit"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_TARGET
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                    removed += 1
+                except OSError:
+                    pass  # already evicted by another process
+                total -= size
+        with self._lock:
+            self._size = total
+            self._unscanned = 0
+            self._rescan_at = max(RESCAN_MIN_BYTES, (self.max_bytes - total) // RESCAN_FRACTION)
+            self.evictions += removed
+
+    def clear(self):
+        """Delete every cached entry and reset the counters"""
+        for _, _, path in self._entries() + [(0, 0, path) for path in self._stats_files()]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._size = 0
+            self._flushed = self.counters()
+
+    def counters(self):
+        """Return this process's counters as a dict"""
+        return {name: getattr(self, name) for name in COUNTERS}
+
+    def add_counters(self, counts):
+        """Add counts reported by another process, e.g. a batch worker"""
+        with self._lock:
+            for name in COUNTERS:
+                setattr(self, name, getattr(self, name) + counts.get(name, 0))
+
+    def _stats_files(self):
+        directory = os.path.join(self.directory, STATS_DIR)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        return [os.path.join(directory, name) for name in names if name.endswith(STATS_SUFFIX)]
+
+    def _write_stats(self, counts):
+        directory = os.path.join(self.directory, STATS_DIR)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(counts, f)
+            os.replace(tmp, os.path.join(directory, uuid.uuid4().hex + STATS_SUFFIX))
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def flush_stats(self):
+        """Persist the counts gathered since the last flush; returns False if the cache is unwritable"""
+        with self._lock:
+            current = self.counters()
+            delta = {name: current[name] - self._flushed[name] for name in COUNTERS}
+            self._flushed = current
+        try:
+            if any(delta.values()):
+                self._write_stats(delta)
+        except OSError:
+            with self._lock:
+                # Keep the counts pending, so the next flush writes them
+                self._flushed = {name: self._flushed[name] - delta[name] for name in COUNTERS}
+            return False
+        try:
+            files = self._stats_files()
+            if len(files) >= STATS_MERGE_AT:
+                self._merge_stats(files)
+        except OSError:
+            return False
+        return True
+
+    def _merge_stats(self, files):
+        """Fold counter files into one; each file is claimed by renaming it first"""
+        claimed = []
+        for path in files:
+            mine = f'{path}.{os.getpid()}.merging'
+            try:
+                os.rename(path, mine)  # fails if another process claimed it
+            except OSError:
+                continue
+            claimed.append(mine)
+        total = dict.fromkeys(COUNTERS, 0)
+        for path in claimed:
+            for name, value in _read_stats(path).items():
+                if name in total:
+                    total[name] += value
+        self._write_stats(total)
+        for path in claimed:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return the counters of every run so far (this one included) and the on-disk totals"""
+        totals = dict.fromkeys(COUNTERS, 0)
+        for path in self._stats_files():
+            for name, value in _read_stats(path).items():
+                if name in totals:
+                    totals[name] += value
+        with self._lock:
+            for name in COUNTERS:
+                totals[name] += getattr(self, name) - self._flushed[name]
+        entries = self._entries()
+        lookups = totals['hits'] + totals['misses']
+        return {
+            'directory': self.directory,
+            'hits': totals['hits'],
+            'misses': totals['misses'],
+            'hit_rate': totals['hits'] / lookups if lookups else 0.0,
+            'writes': totals['writes'],
+            'evictions': totals['evictions'],
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+
+_default_cache = None
+
+
+def default_cache():
+    """Return the process-wide cache instance"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ConversionCache()
+        atexit.register(_default_cache.flush_stats)
+    return _default_cache
+
+
+def convert_file(image_path, width=100, chars=converter.ASCII_CHARS, cache=None, dither=None):
+    """Convert an image file through the cache, converting only on a miss"""
+    cache = cache or default_cache()
+    with instrument.span('cache_lookup') as span:
+        key = cache.conversion_key(image_path, width, chars, dither)
+        art = cache.get(key)
+        span.count(hits=art is not None)
+    if art is None:
+        art = converter.convert_file(image_path, width, chars, dither)
+        try:
+            with instrument.span('cache_store'):
+                cache.put(key, art)
+        except OSError:
+            pass  # an unwritable cache must never break a conversion
+    return art
@@ -5,28 +5,138 @@ import tkinter as tk
 from tkinter import messagebox, filedialog
 from PIL import Image, ImageDraw
 import io
+import math
+from collections import deque
+import converter
+import glyphs
+import output
+
+# Each cell holds one UTF-32 code point, so every character is 4 bytes wide
+CELL_ENCODING = 'utf-32-le'
+CELL_SIZE = 4
+
+# Number of recent changes kept for AsciiCanvas.changes_since
+CHANGE_LOG_SIZE = 4096
+
+# Pointer motion is coalesced and drawn once per frame
+MOTION_INTERVAL = 16  # ms
+# Points per canvas line item before a long stroke starts a new item, which
+# keeps each coords() update cheap
+STROKE_CHUNK = 512
+
+# Live preview of the drawing canvas
+PREVIEW_WIDTH = 100
+PREVIEW_INTERVAL = 16  # ms between preview refreshes, about one frame
+# Resampling reads neighbouring pixels, so a stroke can change cells up to
+# this many cells away from the ones it touches
+PREVIEW_SUPPORT_CELLS = 2
+
+# Glyphs of the drawing canvas conversion, darkest first
+DRAWING_CHARS = ('@', '#', 'S', '%', '?', '*', '+', ';', ':', ',', '.', ' ')
+
+
+def _cell(char):
+    """Encode a single character as one canvas cell"""
+    return (char[:1] or ' ').encode(CELL_ENCODING)
+
+
+def drawing_to_ascii(img, new_width=100, chars=DRAWING_CHARS, shape_match=False):
+    """Convert a drawing canvas image to ASCII art, as DrawingCanvas does"""
+    if shape_match:
+        # The pen is the ink: white strokes on a black canvas
+        return glyphs.image_to_glyphs(img, new_width, invert=True, trailing_newline=True)
+    # Convert to grayscale before resizing, then map through the shared engine
+    img = converter.resize_image(converter.grayscale(img), new_width)
+    return converter.frame_to_ascii(img, chars, trailing_newline=True)
+
 
 class AsciiCanvas:
-    """Interactive canvas for creating ASCII art"""
+    """Interactive canvas for creating ASCII art
+    
+    Characters are stored in one flat ``bytearray`` of fixed-width cells, so
+    fills, clears and blits are slice assignments. Every change bumps
+    ``version`` and marks the affected rows dirty; rendering reuses the
+    cached strings of untouched rows, and ``changes_since`` reports only
+    what changed after a given version.
+    """
     
     def __init__(self, width=80, height=24):
         """Initialize canvas with given dimensions"""
         self.width = width
         self.height = height
-        self.canvas = [[' ' for _ in range(width)] for _ in range(height)]
+        self.stride = width * CELL_SIZE
+        self._blank = _cell(' ') * (width * height)
+        self.cells = bytearray(self._blank)
+        self.version = 0
+        self._row_versions = [0] * height
+        self._row_cache = [None] * height
+        self._changes = deque(maxlen=CHANGE_LOG_SIZE)  # (version, x1, y1, x2, y2)
+        self._rendered = None
+        self._rendered_version = -1
+    
+    def _touch(self, x1, y1, x2, y2):
+        """Record that the (inclusive, already clipped) rectangle changed"""
+        self.version += 1
+        count = y2 - y1 + 1
+        self._row_versions[y1:y2 + 1] = [self.version] * count
+        self._row_cache[y1:y2 + 1] = [None] * count
+        self._changes.append((self.version, x1, y1, x2, y2))
+    
+    @property
+    def canvas(self):
+        """Rows of single characters (a copy; modify through the drawing methods)"""
+        text = self.cells.decode(CELL_ENCODING)
+        return [list(text[i:i + self.width]) for i in range(0, len(text), self.width)]
         
     def clear(self):
         """Clear the canvas"""
-        self.canvas = [[' ' for _ in range(self.width)] for _ in range(self.height)]
+        self.cells[:] = self._blank
+        self._touch(0, 0, self.width - 1, self.height - 1)
     
     def set_pixel(self, x, y, char='█'):
         """Set a character at position (x, y)"""
         if 0 <= x < self.width and 0 <= y < self.height:
-            self.canvas[y][x] = char
+            offset = y * self.stride + x * CELL_SIZE
+            self.cells[offset:offset + CELL_SIZE] = _cell(char)
+            self._touch(x, y, x, y)
+    
+    def fill_span(self, x1, x2, y, char='█'):
+        """Fill row y from x1 to x2 inclusive, clipped to the canvas"""
+        x1, x2 = max(min(x1, x2), 0), min(max(x1, x2), self.width - 1)
+        if x1 > x2 or not 0 <= y < self.height:
+            return
+        start = y * self.stride + x1 * CELL_SIZE
+        count = x2 - x1 + 1
+        self.cells[start:start + count * CELL_SIZE] = _cell(char) * count
+        self._touch(x1, y, x2, y)
+    
+    def fill_column(self, x, y1, y2, char='█'):
+        """Fill column x from y1 to y2 inclusive, clipped to the canvas"""
+        y1, y2 = max(min(y1, y2), 0), min(max(y1, y2), self.height - 1)
+        if y1 > y2 or not 0 <= x < self.width:
+            return
+        start = y1 * self.stride + x * CELL_SIZE
+        end = y2 * self.stride + x * CELL_SIZE + 1
+        count = y2 - y1 + 1
+        # One strided assignment per byte of the cell
+        for i, byte in enumerate(_cell(char)):
+            self.cells[start + i:end + i:self.stride] = bytes((byte,)) * count
+        self._touch(x, y1, x, y2)
     
     def draw_line(self, x1, y1, x2, y2, char='█'):
         """Draw a line from (x1, y1) to (x2, y2)"""
+        if y1 == y2:
+            self.fill_span(x1, x2, y1, char)
+            return
+        if x1 == x2:
+            self.fill_column(x1, y1, y2, char)
+            return
+        
         # Bresenham's line algorithm
+        bounds = (max(min(x1, x2), 0), max(min(y1, y2), 0),
+                  min(max(x1, x2), self.width - 1), min(max(y1, y2), self.height - 1))
+        cell = _cell(char)
+        cells, stride, width, height = self.cells, self.stride, self.width, self.height
         dx = abs(x2 - x1)
         dy = abs(y2 - y1)
         sx = 1 if x1 < x2 else -1
@@ -34,7 +144,9 @@ class AsciiCanvas:
         err = dx - dy
         
         while True:
-            self.set_pixel(x1, y1, char)
+            if 0 <= x1 < width and 0 <= y1 < height:
+                offset = y1 * stride + x1 * CELL_SIZE
+                cells[offset:offset + CELL_SIZE] = cell
             if x1 == x2 and y1 == y2:
                 break
             e2 = 2 * err
@@ -44,13 +156,14 @@ class AsciiCanvas:
             if e2 < dx:
                 err += dx
                 y1 += sy
+        if bounds[0] <= bounds[2] and bounds[1] <= bounds[3]:
+            self._touch(*bounds)
     
     def draw_rectangle(self, x1, y1, x2, y2, char='█', fill=False):
         """Draw a rectangle"""
         if fill:
-            for y in range(min(y1, y2), max(y1, y2) + 1):
-                for x in range(min(x1, x2), max(x1, x2) + 1):
-                    self.set_pixel(x, y, char)
+            for y in range(max(min(y1, y2), 0), min(max(y1, y2), self.height - 1) + 1):
+                self.fill_span(x1, x2, y, char)
         else:
             self.draw_line(x1, y1, x2, y1, char)  # Top
             self.draw_line(x1, y2, x2, y2, char)  # Bottom
@@ -59,22 +172,81 @@ class AsciiCanvas:
     
     def draw_text(self, x, y, text):
         """Draw text at position (x, y)"""
-        for i, char in enumerate(text):
-            if x + i < self.width:
-                self.set_pixel(x + i, y, char)
+        start, end = max(x, 0), min(x + len(text), self.width)
+        if start >= end or not 0 <= y < self.height:
+            return
+        offset = y * self.stride + start * CELL_SIZE
+        self.cells[offset:offset + (end - start) * CELL_SIZE] = \
+            text[start - x:end - x].encode(CELL_ENCODING)
+        self._touch(start, y, end - 1, y)
+    
+    def blit(self, source, x=0, y=0):
+        """Copy another AsciiCanvas onto this one with its top-left at (x, y)"""
+        x1, x2 = max(x, 0), min(x + source.width, self.width)
+        if x1 >= x2:
+            return
+        length = (x2 - x1) * CELL_SIZE
+        y1, y2 = max(y, 0), min(y + source.height, self.height)
+        for row in range(y1, y2):
+            src = (row - y) * source.stride + (x1 - x) * CELL_SIZE
+            dst = row * self.stride + x1 * CELL_SIZE
+            self.cells[dst:dst + length] = source.cells[src:src + length]
+        if y1 < y2:
+            self._touch(x1, y1, x2 - 1, y2 - 1)
+    
+    def get_row(self, y):
+        """Return row y as a string, re-rendering it only if it changed"""
+        row = self._row_cache[y]
+        if row is None:
+            start = y * self.stride
+            row = self._row_cache[y] = self.cells[start:start + self.stride].decode(CELL_ENCODING)
+        return row
     
     def get_canvas(self):
         """Return the canvas as a string"""
-        return '\n'.join(''.join(row) for row in self.canvas)
+        if self._rendered_version != self.version:
+            self._rendered = '\n'.join([self.get_row(y) for y in range(self.height)])
+            self._rendered_version = self.version
+        return self._rendered
     
-    def display(self):
-        """Display the canvas"""
-        print(self.get_canvas())
+    def changes_since(self, version):
+        """Return (current version, changed spans) for changes after ``version``
+        
+        Spans are (row, column, text) tuples giving the current contents of
+        the changed part of each row. If ``version`` is older than the change
+        log, every row changed since then is returned in full.
+        """
+        if version >= self.version:
+            return self.version, []
+        extents = {}
+        if self._changes and self._changes[0][0] <= version + 1:
+            for changed, x1, y1, x2, y2 in reversed(self._changes):
+                if changed <= version:
+                    break
+                for y in range(y1, y2 + 1):
+                    lo, hi = extents.get(y, (x1, x2))
+                    extents[y] = (min(lo, x1), max(hi, x2))
+        else:
+            for y, changed in enumerate(self._row_versions):
+                if changed > version:
+                    extents[y] = (0, self.width - 1)
+        spans = [(y, x1, self.get_row(y)[x1:x2 + 1]) for y, (x1, x2) in sorted(extents.items())]
+        return self.version, spans
+    
+    def display(self, renderer=None):
+        """Display the canvas
+        
+        With a ``terminal.TerminalRenderer`` the canvas is drawn in place and
+        only the cells changed since the last display are written.
+        """
+        if renderer is None:
+            print(self.get_canvas())
+        else:
+            renderer.render(self.get_canvas())
     
     def save(self, filename):
         """Save canvas to file"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(self.get_canvas())
+        output.write_rows(filename, (self.get_row(y) for y in range(self.height)))
         print(f"Canvas saved to {filename}")
 
 
@@ -103,6 +275,16 @@ class DrawingCanvas:
         self.pen_color = 'white'
         self.pen_width = 3
         
+        # Current stroke: its canvas polyline item and coordinates, the
+        # motion points not yet drawn and the scheduled flush
+        self.stroke_item = None
+        self.stroke_points = []
+        self.pending_points = []
+        self.stroke_job = None
+        
+        # Match characters by glyph shape rather than brightness
+        self.shape_match = tk.BooleanVar(self.root, value=False)
+        
         # Bind mouse events
         self.canvas.bind('<Button-1>', self.start_draw)
         self.canvas.bind('<B1-Motion>', self.draw_line)
@@ -112,7 +294,16 @@ class DrawingCanvas:
         self.create_controls()
         
         # ASCII characters for conversion (from darkest to lightest)
-        self.ascii_chars = ['@', '#', 'S', '%', '?', '*', '+', ';', ':', ',', '.', ' ']
+        self.ascii_chars = list(DRAWING_CHARS)
+        
+        # Live preview state: the open Text widget, its current rows, the
+        # pending dirty cell rectangle and the scheduled refresh
+        self.preview_window = None
+        self.preview_text = None
+        self.preview_rows = []
+        self.preview_dirty = None
+        self.preview_job = None
+        self.preview_cols, self.preview_height = converter.target_size((width, height), PREVIEW_WIDTH)
         
     def create_controls(self):
         """Create control buttons"""
@@ -131,6 +322,10 @@ class DrawingCanvas:
                           command=lambda s=size: self.set_pen_width(s))
             btn.pack(side=tk.LEFT, padx=2)
         
+        shape_btn = tk.Checkbutton(control_frame, text="Shape Match", variable=self.shape_match,
+                                   command=self.toggle_shape_match)
+        shape_btn.pack(side=tk.LEFT, padx=10)
+        
         # Convert and save button
         convert_btn = tk.Button(control_frame, text="Convert to ASCII & Save", 
                                command=self.convert_and_save, bg='lightgreen')
@@ -145,65 +340,81 @@ class DrawingCanvas:
         """Start drawing"""
         self.old_x = event.x
         self.old_y = event.y
+        self.stroke_item = None
+        self.stroke_points = [event.x, event.y]
+        self.pending_points = []
     
     def draw_line(self, event):
-        """Draw line as mouse moves"""
-        if self.old_x and self.old_y:
-            # Draw on canvas
-            self.canvas.create_line(self.old_x, self.old_y, event.x, event.y,
+        """Record mouse motion; the stroke is drawn once per frame"""
+        if self.old_x is None or (event.x, event.y) == (self.old_x, self.old_y):
+            return
+        self.pending_points += (event.x, event.y)
+        self.old_x = event.x
+        self.old_y = event.y
+        if self.stroke_job is None:
+            self.stroke_job = self.root.after(MOTION_INTERVAL, self.flush_stroke)
+    
+    def flush_stroke(self):
+        """Draw the motion recorded since the last flush"""
+        self.stroke_job = None
+        if not self.pending_points:
+            return
+        new_points = self.pending_points
+        self.pending_points = []
+        segment = self.stroke_points[-2:] + new_points
+        
+        # Extend the stroke's single polyline item on the canvas
+        if self.stroke_item is None or len(self.stroke_points) >= STROKE_CHUNK * 2:
+            self.stroke_points = segment
+            self.stroke_item = self.canvas.create_line(*segment,
                                    width=self.pen_width, fill=self.pen_color,
-                                   capstyle=tk.ROUND, smooth=True)
-            
-            # Draw on PIL image
-            self.draw.line([self.old_x, self.old_y, event.x, event.y],
-                          fill=self.pen_color, width=self.pen_width)
-            
-            self.old_x = event.x
-            self.old_y = event.y
+                                   capstyle=tk.ROUND, joinstyle=tk.ROUND)
+        else:
+            self.stroke_points += new_points
+            self.canvas.coords(self.stroke_item, *self.stroke_points)
+        
+        # Draw all new segments on the PIL image in one call
+        self.draw.line(segment, fill=self.pen_color, width=self.pen_width, joint='curve')
+        xs, ys = segment[0::2], segment[1::2]
+        self.mark_preview_dirty(min(xs), min(ys), max(xs), max(ys))
     
     def stop_draw(self, event):
         """Stop drawing"""
+        if self.stroke_job is not None:
+            self.root.after_cancel(self.stroke_job)
+        self.flush_stroke()
         self.old_x = None
         self.old_y = None
+        self.stroke_item = None
+        self.stroke_points = []
     
     def clear_canvas(self):
         """Clear the canvas"""
         self.canvas.delete("all")
+        self.stroke_item = None
         self.image = Image.new('RGB', (self.width, self.height), 'black')
         self.draw = ImageDraw.Draw(self.image)
+        self.mark_preview_dirty(0, 0, self.width, self.height)
     
     def set_pen_width(self, width):
         """Set pen width"""
         self.pen_width = width
     
+    def toggle_shape_match(self):
+        """Re-render the open preview after switching the matching mode"""
+        self.mark_preview_dirty(0, 0, self.width, self.height)
+    
     def image_to_ascii(self, img, new_width=100):
         """Convert image to ASCII art"""
-        # Convert to grayscale
-        img = img.convert('L')
-        
-        # Resize image
-        width, height = img.size
-        aspect_ratio = height / width
-        new_height = int(aspect_ratio * new_width * 0.55)  # 0.55 to adjust for character aspect ratio
-        img = img.resize((new_width, new_height))
-        
-        # Convert pixels to ASCII
-        pixels = img.getdata()
-        ascii_str = ""
-        
-        for i, pixel in enumerate(pixels):
-            # Map pixel brightness to ASCII character
-            ascii_str += self.ascii_chars[pixel // 25]
-            
-            # Add newline at end of row
-            if (i + 1) % new_width == 0:
-                ascii_str += '\n'
-        
-        return ascii_str
+        return drawing_to_ascii(img, new_width, self.ascii_chars, self.shape_match.get())
     
     def preview_ascii(self):
-        """Preview ASCII art in a new window"""
-        ascii_art = self.image_to_ascii(self.image)
+        """Open the live ASCII preview window, or raise it if already open"""
+        if self.preview_text is not None:
+            self.preview_window.lift()
+            return
+        ascii_art = self.image_to_ascii(self.image, self.preview_cols)
+        self.preview_rows = ascii_art.splitlines()
         
         # Create preview window
         preview_window = tk.Toplevel(self.root)
@@ -225,6 +436,84 @@ class DrawingCanvas:
         
         text_widget.insert('1.0', ascii_art)
         text_widget.config(state=tk.DISABLED)
+        
+        self.preview_window = preview_window
+        self.preview_text = text_widget
+        preview_window.protocol("WM_DELETE_WINDOW", self.close_preview)
+    
+    def close_preview(self):
+        """Close the live preview window"""
+        if self.preview_job is not None:
+            self.root.after_cancel(self.preview_job)
+        self.preview_window.destroy()
+        self.preview_window = None
+        self.preview_text = None
+        self.preview_dirty = None
+        self.preview_job = None
+    
+    def mark_preview_dirty(self, x1, y1, x2, y2):
+        """Mark the preview cells under a drawn segment for re-sampling"""
+        if self.preview_text is None:
+            return
+        pad = self.pen_width / 2 + 1
+        cell_w = self.width / self.preview_cols
+        cell_h = self.height / self.preview_height
+        support = PREVIEW_SUPPORT_CELLS
+        c1 = max(int((min(x1, x2) - pad) // cell_w) - support, 0)
+        r1 = max(int((min(y1, y2) - pad) // cell_h) - support, 0)
+        c2 = min(int((max(x1, x2) + pad) // cell_w) + support, self.preview_cols - 1)
+        r2 = min(int((max(y1, y2) + pad) // cell_h) + support, self.preview_height - 1)
+        if c1 > c2 or r1 > r2:
+            return
+        if self.preview_dirty:
+            d = self.preview_dirty
+            c1, r1, c2, r2 = min(c1, d[0]), min(r1, d[1]), max(c2, d[2]), max(r2, d[3])
+        self.preview_dirty = (c1, r1, c2, r2)
+        # Coalesce all strokes within one frame into a single refresh
+        if self.preview_job is None:
+            self.preview_job = self.root.after(PREVIEW_INTERVAL, self.refresh_preview)
+    
+    def render_cells(self, c1, r1, c2, r2):
+        """Re-sample preview cells c1..c2 x r1..r2 (inclusive) as rows of text
+        
+        Only the source pixels under those cells, plus a margin for the
+        resampling filter, are converted; the result matches the same cells
+        of a full ``image_to_ascii`` conversion.
+        """
+        cell_w = self.width / self.preview_cols
+        cell_h = self.height / self.preview_height
+        box = (c1 * cell_w, r1 * cell_h, (c2 + 1) * cell_w, (r2 + 1) * cell_h)
+        margin_x = math.ceil(cell_w * (PREVIEW_SUPPORT_CELLS + 1))
+        margin_y = math.ceil(cell_h * (PREVIEW_SUPPORT_CELLS + 1))
+        crop = (max(int(box[0]) - margin_x, 0), max(int(box[1]) - margin_y, 0),
+                min(math.ceil(box[2]) + margin_x, self.width), min(math.ceil(box[3]) + margin_y, self.height))
+        region = converter.grayscale(self.image.crop(crop))
+        size = (c2 - c1 + 1, r2 - r1 + 1)
+        region_box = (box[0] - crop[0], box[1] - crop[1], box[2] - crop[0], box[3] - crop[1])
+        if self.shape_match.get():
+            text = glyphs.pixels_to_glyphs(region, size, glyphs.glyph_matrix(), box=region_box, invert=True)
+        else:
+            text = converter.pixels_to_ascii(region.resize(size, box=region_box), self.ascii_chars)
+        count = size[0]
+        return [text[i:i + count] for i in range(0, len(text), count)]
+    
+    def refresh_preview(self):
+        """Patch the dirty cells of the preview Text widget in place"""
+        self.preview_job = None
+        if self.preview_text is None or self.preview_dirty is None:
+            return
+        c1, r1, c2, r2 = self.preview_dirty
+        self.preview_dirty = None
+        text = self.preview_text
+        text.config(state=tk.NORMAL)
+        for row, segment in enumerate(self.render_cells(c1, r1, c2, r2), r1):
+            old = self.preview_rows[row]
+            if old[c1:c2 + 1] == segment:
+                continue
+            self.preview_rows[row] = old[:c1] + segment + old[c2 + 1:]
+            text.delete(f'{row + 1}.{c1}', f'{row + 1}.{c2 + 1}')
+            text.insert(f'{row + 1}.{c1}', segment)
+        text.config(state=tk.DISABLED)
     
     def convert_and_save(self):
         """Convert drawing to ASCII and save"""
@@ -236,10 +525,7 @@ class DrawingCanvas:
         )
         
         if filename:
-            ascii_art = self.image_to_ascii(self.image)
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(ascii_art)
+            converter.save_ascii(filename, self.image_to_ascii(self.image))
             
             messagebox.showinfo("Success", f"ASCII art saved to {filename}")
             print(f"ASCII art saved to {filename}")
@@ -0,0 +1,158 @@
+"""
+Color module for AsciiForge - Color ASCII art for terminals and HTML
+
+Each character cell keeps the average color of the pixels it covers. The
+glyphs are exactly those of the monochrome conversion (same resize, same
+luminance mapping); color is sampled from the same resized image, so the
+extra cost is one RGB conversion plus the output encoding.
+
+Colors are quantized before encoding so neighbouring cells share a color
+and runs of identical color are emitted with a single escape code or
+<span>. Whitespace never changes the current color.
+
+Modes:
+    ansi      24-bit ANSI escapes, channels posterized to ``bits`` bits
+    ansi256   xterm 256-color escapes (nearest of the 6x6x6 cube + grays)
+    html      <pre> block with one CSS class per distinct color
+"""
+import html
+import sys
+from array import array
+from functools import lru_cache
+from PIL import Image
+
+import converter
+import instrument
+
+
+COLOR_MODES = ('ansi', 'ansi256', 'html')
+DEFAULT_BITS = 5  # bits kept per channel for truecolor output
+RESET = '\x1b[0m'
+# quantize() against xterm_palette() yields indices from color 16 on
+XTERM_OFFSET = bytes((index + 16) & 0xFF for index in range(256))
+
+HTML_STYLE = 'background:#000;font-family:monospace;line-height:1.0;font-size:10px'
+
+
+def posterize_table(bits):
+    """Per-channel lookup table keeping ``bits`` bits, at the middle of each band"""
+    if bits >= 8:
+        return list(range(256)) * 3
+    shift = 8 - bits
+    half = 1 << (shift - 1)
+    band = [min(255, (value >> shift << shift) + half) for value in range(256)]
+    return band * 3
+
+
+@lru_cache(maxsize=1)
+def xterm_palette():
+    """A 'P' image holding xterm colors 16-255 for Image.quantize"""
+    levels = (0, 95, 135, 175, 215, 255)
+    colors = [(r, g, b) for r in levels for g in levels for b in levels]
+    colors += [(v, v, v) for v in range(8, 239, 10)]
+    palette = Image.new('P', (1, 1))
+    palette.putpalette([channel for color in colors for channel in color])
+    return palette
+
+
+def sample_cells(image, width=100):
+    """Resize once and return (grayscale cells, RGB cells) for the character grid"""
+    small = converter.resize_image(image, width)
+    with instrument.span('color_sampling') as span:
+        span.count(cells=small.width * small.height)
+        rgb = small.convert('RGB')
+    return converter.grayscale(small), rgb
+
+
+def cell_codes(rgb, mode='ansi', bits=DEFAULT_BITS):
+    """Quantize RGB cells and return one integer color code per cell
+
+    Codes are xterm color numbers for ``ansi256`` and packed RGBX words
+    (see ``code_rgb``) otherwise; equal colors always have equal codes.
+    """
+    with instrument.span('color_quantize') as span:
+        span.count(cells=rgb.width * rgb.height)
+        if mode == 'ansi256':
+            indexed = rgb.quantize(palette=xterm_palette(), dither=Image.Dither.NONE)
+            return array('B', indexed.tobytes().translate(XTERM_OFFSET))
+        quantized = rgb.point(posterize_table(bits)).convert('RGBX')
+        return array('I', quantized.tobytes())
+
+
+def code_rgb(code):
+    """Unpack a packed RGBX color code into (r, g, b)"""
+    if sys.byteorder == 'little':
+        return code & 0xFF, code >> 8 & 0xFF, code >> 16 & 0xFF
+    return code >> 24, code >> 16 & 0xFF, code >> 8 & 0xFF
+
+
+def color_runs(glyphs, codes, width):
+    """Yield rows as lists of (code, text) runs of identically colored cells"""
+    for start in range(0, len(glyphs), width):
+        row = glyphs[start:start + width]
+        runs = []
+        run_start, run_code = 0, codes[start]
+        for x in range(1, len(row)):
+            code = codes[start + x]
+            if code != run_code and not row[x].isspace():
+                if row[run_start:x].isspace():
+                    run_code = code  # a run of blanks takes the next color
+                    continue
+                runs.append((run_code, row[run_start:x]))
+                run_start, run_code = x, code
+        runs.append((run_code, row[run_start:]))
+        yield runs
+
+
+def _ansi_escape(code, mode):
+    if mode == 'ansi256':
+        return f'\x1b[38;5;{code}m'
+    return '\x1b[38;2;%d;%d;%dm' % code_rgb(code)
+
+
+def encode_ansi(rows, mode='ansi'):
+    """Encode color runs as ANSI escapes; every row ends with a reset"""
+    lines = []
+    for runs in rows:
+        lines.append(''.join([_ansi_escape(code, mode) + text for code, text in runs]) + RESET)
+    return '\n'.join(lines)
+
+
+def encode_html(rows):
+    """Encode color runs as a standalone <pre> block with a class per color"""
+    classes = {}
+    lines = []
+    for runs in rows:
+        parts = []
+        for code, text in runs:
+            name = classes.get(code)
+            if name is None:
+                name = classes[code] = f'c{len(classes):x}'
+            parts.append(f'<span class="{name}">{html.escape(text, quote=False)}</span>')
+        lines.append(''.join(parts))
+    style = ''.join('.%s{color:#%02x%02x%02x}' % ((name,) + code_rgb(code)) for code, name in classes.items())
+    return (f'<style>{style}</style>\n<pre style="{HTML_STYLE}">\n'
+            + '\n'.join(lines) + '\n</pre>\n')
+
+
+def image_to_color(image, width=100, mode='ansi', chars=converter.ASCII_CHARS, bits=DEFAULT_BITS,
+                   dither=None):
+    """Convert a PIL image to color ASCII art in the given mode"""
+    if mode not in COLOR_MODES:
+        raise ValueError(f"Unknown color mode: {mode} (choose from {', '.join(COLOR_MODES)})")
+    gray, rgb = sample_cells(image, width)
+    glyphs = converter.pixels_to_ascii(gray, chars, dither)
+    if not glyphs:
+        return ''
+    codes = cell_codes(rgb, mode, bits)
+    with instrument.span('color_encoding') as span:
+        span.count(cells=len(glyphs))
+        rows = color_runs(glyphs, codes, gray.width)
+        return encode_html(rows) if mode == 'html' else encode_ansi(rows, mode)
+
+
+def convert_file(image_path, width=100, mode='ansi', chars=converter.ASCII_CHARS, bits=DEFAULT_BITS,
+                 dither=None):
+    """Open an image file and convert it to color ASCII art"""
+    with converter.open_image(image_path) as image:
+        return image_to_color(image, width, mode, chars, bits, dither)
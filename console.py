@@ -0,0 +1,138 @@
+"""
+Console module for AsciiForge - Batched, virtualized output console
+
+Writes are buffered and applied to the console at a fixed cadence rather
+than redrawing Tk on every call. Scrollback lives in a ring buffer of lines
+capped at SCROLLBACK_LINES, and the Text widget only ever holds the lines
+that are currently visible, so printing very large art stays cheap.
+"""
+import tkinter as tk
+from collections import deque
+
+
+FLUSH_INTERVAL = 50  # ms between applying buffered writes
+SCROLLBACK_LINES = 250000
+
+
+class OutputConsole(tk.Frame):
+    """Read-only scrolling text console with a virtualized viewport"""
+
+    def __init__(self, master, scrollback=SCROLLBACK_LINES, flush_interval=FLUSH_INTERVAL,
+                 font=('Courier', 9), bg='#0d0d0d', fg='#00ff00', height=12):
+        super().__init__(master, bg=bg)
+        self.flush_interval = flush_interval
+        # The last line is the one being written to; it may not be finished
+        self.lines = deque([''], maxlen=scrollback)
+        self.top = 0          # index in self.lines of the first visible line
+        self.follow = True    # keep the newest output in view
+        self._pending = []
+        self._flush_job = None
+        self._rows = height
+
+        self.text = tk.Text(self, height=height, font=font, bg=bg, fg=fg, insertbackground='white',
+                            wrap=tk.NONE, state=tk.DISABLED, takefocus=True)
+        self.vbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.hbar = tk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.text.xview)
+        self.text.configure(xscrollcommand=self.hbar.set)
+        self.vbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.hbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.text.bind('<Configure>', self._on_resize)
+        self.text.bind('<MouseWheel>', self._on_wheel)
+        self.text.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.text.bind('<Button-5>', lambda event: self.scroll(3))
+        self.text.bind('<Prior>', lambda event: self.scroll(-self._rows))
+        self.text.bind('<Next>', lambda event: self.scroll(self._rows))
+        self.text.bind('<Control-Home>', lambda event: self.scroll_to(0))
+        self.text.bind('<Control-End>', lambda event: self.scroll_to(len(self.lines)))
+        self.text.bind('<Button-1>', lambda event: self.text.focus_set())
+
+    def write(self, text):
+        """Queue ``text`` for display at the next flush"""
+        if not text:
+            return
+        self._pending.append(text)
+        if self._flush_job is None:
+            self._flush_job = self.after(self.flush_interval, self.flush)
+
+    def flush(self):
+        """Apply buffered writes now"""
+        if self._flush_job is not None:
+            self.after_cancel(self._flush_job)
+            self._flush_job = None
+        if not self._pending:
+            return
+        pieces = ''.join(self._pending).split('\n')
+        self._pending = []
+        lines = self.lines
+        lines[-1] += pieces[0]
+        new = pieces[1:]
+        dropped = max(0, len(lines) + len(new) - lines.maxlen)
+        if len(new) > lines.maxlen:
+            new = new[-lines.maxlen:]
+        lines.extend(new)
+        self.top = max(0, self.top - dropped)
+        self._render()
+
+    def clear(self):
+        """Discard all output, including writes not yet flushed"""
+        self._pending = []
+        self.lines.clear()
+        self.lines.append('')
+        self.top = 0
+        self.follow = True
+        self._render()
+
+    def get(self):
+        """Return the retained output as one string"""
+        self.flush()
+        return '\n'.join(self.lines)
+
+    def _last_top(self):
+        return max(0, len(self.lines) - self._rows)
+
+    def scroll_to(self, line):
+        """Make ``line`` the first visible line"""
+        self.top = min(max(0, int(line)), self._last_top())
+        self.follow = self.top >= self._last_top()
+        self._render()
+
+    def scroll(self, lines):
+        self.scroll_to(self.top + lines)
+
+    def yview(self, *args):
+        """Scrollbar protocol: ('moveto', fraction) or ('scroll', n, 'units'|'pages')"""
+        if args[0] == 'moveto':
+            self.scroll_to(float(args[1]) * len(self.lines))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.scroll(step * self._rows if args[2] == 'pages' else step)
+
+    def _on_wheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll(-3 * delta)
+        return 'break'
+
+    def _on_resize(self, event):
+        linespace = self.text.tk.call('font', 'metrics', self.text.cget('font'), '-linespace')
+        rows = max(1, event.height // max(1, int(linespace)))
+        if rows != self._rows:
+            self._rows = rows
+            self._render()
+
+    def _render(self):
+        lines = self.lines
+        if self.follow:
+            self.top = self._last_top()
+        end = min(len(lines), self.top + self._rows)
+        visible = '\n'.join([lines[i] for i in range(self.top, end)])
+        xview = self.text.xview()[0]
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete('1.0', tk.END)
+        self.text.insert('1.0', visible)
+        self.text.configure(state=tk.DISABLED)
+        self.text.xview_moveto(xview)
+        total = max(1, len(lines))
+        self.vbar.set(self.top / total, end / total)
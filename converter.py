@@ -0,0 +1,294 @@
+"""
+Converter module for AsciiForge - Shared image to ASCII conversion engine
+"""
+import os
+from functools import lru_cache
+from PIL import Image, ImageChops
+
+import instrument
+
+
+ASCII_CHARS = ['@', '#', 'S', '%', '?', '*', '+', ';', ':', ',', '.']
+
+# Character cells are roughly twice as tall as they are wide
+ASPECT_FACTOR = 0.55
+
+# Width of the luminance band mapped to each character
+LEVEL_STEP = 25
+
+# Dithering modes for the glyph mapping (None maps each pixel independently)
+DITHER_MODES = ('floyd-steinberg', 'atkinson', 'bayer')
+
+# Ordered dithering threshold matrix
+BAYER_8 = (
+    (0, 32, 8, 40, 2, 34, 10, 42),
+    (48, 16, 56, 24, 50, 18, 58, 26),
+    (12, 44, 4, 36, 14, 46, 6, 38),
+    (60, 28, 52, 20, 62, 30, 54, 22),
+    (3, 35, 11, 43, 1, 33, 9, 41),
+    (51, 19, 59, 27, 49, 17, 57, 25),
+    (15, 47, 7, 39, 13, 45, 5, 37),
+    (63, 31, 55, 23, 61, 29, 53, 21),
+)
+
+
+def target_size(size, new_width=100):
+    """Return the (columns, rows) character grid for an image of ``size``"""
+    width, height = size
+    aspect_ratio = height / width
+    return new_width, int(new_width * aspect_ratio * ASPECT_FACTOR)
+
+
+def resize_image(image, new_width=100):
+    """Resize image maintaining aspect ratio"""
+    with instrument.span('resize') as span:
+        span.count(pixels=image.width * image.height)
+        return image.resize(target_size(image.size, new_width))
+
+
+def grayscale(image):
+    """Convert image to grayscale"""
+    with instrument.span('grayscale') as span:
+        span.count(pixels=image.width * image.height)
+        return image.convert('L')
+
+
+def _translation(glyphs):
+    """A ``bytes.translate`` table for 256 single-byte glyphs, else a list for ``str.translate``"""
+    try:
+        return ''.join(glyphs).encode('latin-1')
+    except UnicodeEncodeError:
+        return glyphs
+
+
+@lru_cache(maxsize=32)
+def glyph_table(chars=tuple(ASCII_CHARS)):
+    """Build the 256-entry luminance to character lookup table
+
+    Returns a ``bytes`` table for ``bytes.translate`` when every character
+    fits in a single byte, otherwise a 256-item list for ``str.translate``.
+    """
+    last = len(chars) - 1
+    return _translation([chars[min(level // LEVEL_STEP, last)] for level in range(256)])
+
+
+@lru_cache(maxsize=32)
+def index_table(chars=tuple(ASCII_CHARS)):
+    """Like ``glyph_table``, but mapping glyph indices rather than luminance"""
+    last = len(chars) - 1
+    return _translation([chars[min(index, last)] for index in range(256)])
+
+
+def _translate(data, table):
+    if isinstance(table, bytes):
+        return bytes(data).translate(table).decode('latin-1')
+    return bytes(data).decode('latin-1').translate(table)
+
+
+def map_pixels(data, chars=ASCII_CHARS):
+    """Map a buffer of 8-bit luminance values to a string of characters"""
+    return _translate(data, glyph_table(tuple(chars)))
+
+
+def ramp_levels(chars=ASCII_CHARS):
+    """Return the luminance each reachable glyph stands for (its band's middle)"""
+    count = min(len(chars), 255 // LEVEL_STEP + 1)
+    levels = []
+    for index in range(count):
+        low = index * LEVEL_STEP
+        high = 255 if index == count - 1 else low + LEVEL_STEP - 1
+        levels.append((low + high) // 2)
+    return levels
+
+
+def map_indices(indices, chars=ASCII_CHARS):
+    """Map a buffer of glyph indices (0 = first character) to a string"""
+    return _translate(indices, index_table(tuple(chars)))
+
+
+@lru_cache(maxsize=8)
+def _ramp_palette(chars):
+    palette = Image.new('P', (1, 1))
+    palette.putpalette([level for level in ramp_levels(chars) for _ in range(3)])
+    return palette
+
+
+def _floyd_steinberg(image, chars):
+    # Pillow diffuses the error in C when quantizing RGB to a fixed palette
+    indexed = image.convert('RGB').quantize(palette=_ramp_palette(tuple(chars)),
+                                            dither=Image.Dither.FLOYDSTEINBERG)
+    return map_indices(indexed.tobytes(), chars)
+
+
+# Diffused error stays within a few dozen levels, so values are looked up
+# with this offset in tables covering -ATKINSON_OFFSET..255+ATKINSON_OFFSET
+ATKINSON_OFFSET = 256
+
+
+@lru_cache(maxsize=8)
+def _atkinson_tables(chars):
+    """Glyph index and one eighth of the remaining error for each value"""
+    levels = ramp_levels(chars)
+    indices, errors = bytearray(), []
+    for value in range(-ATKINSON_OFFSET, 256 + ATKINSON_OFFSET):
+        index = min(range(len(levels)), key=lambda i: abs(levels[i] - value))
+        indices.append(index)
+        errors.append(round((value - levels[index]) / 8))
+    return bytes(indices), errors
+
+
+def _atkinson(image, chars):
+    # Each pixel passes 1/8 of its error to the next two pixels in its row,
+    # three pixels in the row below and one two rows below. Only the in-row
+    # part is sequential; glyph lookup and the rows below are handled a
+    # whole row at a time.
+    indices, errors = _atkinson_tables(tuple(chars))
+    width, height = image.size
+    data = image.tobytes()
+    below = [ATKINSON_OFFSET] * width
+    below2 = [0] * width
+    out = bytearray()
+    for y in range(height):
+        adjusted = [value + carry for value, carry in zip(data[y * width:(y + 1) * width], below)]
+        next1 = next2 = 0
+        for x, value in enumerate(adjusted):
+            value += next1
+            adjusted[x] = value
+            error = errors[value]
+            next1 = next2 + error
+            next2 = error
+        out += bytes(map(indices.__getitem__, adjusted))
+        row_errors = list(map(errors.__getitem__, adjusted))
+        spread = [0] + row_errors + [0]
+        below = [a + b + c + d + ATKINSON_OFFSET
+                 for a, b, c, d in zip(spread, spread[1:], spread[2:], below2)]
+        below2 = row_errors
+    return map_indices(out, chars)
+
+
+@lru_cache(maxsize=8)
+def _bayer_rows(width):
+    """Ordered-dither thresholds (1..255) for one tile of rows"""
+    rows = []
+    for matrix_row in BAYER_8:
+        thresholds = bytes(threshold * 4 + 2 for threshold in matrix_row)
+        rows.append((thresholds * (width // 8 + 1))[:width])
+    return rows
+
+
+@lru_cache(maxsize=8)
+def _bayer_tables(chars):
+    """Per value: the glyph index at or below it, and how far (0-255) it is towards the next
+
+    Positions are measured between the levels of neighbouring glyphs, so
+    values beyond the first or last glyph's level have nothing to dither
+    towards and always map to that glyph.
+    """
+    levels = ramp_levels(chars)
+    base, fraction = [], []
+    for value in range(256):
+        index = max([0] + [i for i, level in enumerate(levels) if level <= value])
+        base.append(index)
+        if index + 1 < len(levels):
+            low, high = levels[index], levels[index + 1]
+            fraction.append(max(0, (value - low) * 256 // (high - low)))
+        else:
+            fraction.append(0)
+    return base, fraction
+
+
+def _bayer(image, chars):
+    width, height = image.size
+    rows = _bayer_rows(width)
+    threshold = Image.frombytes('L', image.size, b''.join(rows[y % 8] for y in range(height)))
+    base, fraction = _bayer_tables(tuple(chars))
+    # 128 + fraction - threshold, so >= 128 where the next glyph wins
+    ahead = ImageChops.subtract(image.point(fraction), threshold, 1.0, 128)
+    step = ahead.point([1 if value >= 128 else 0 for value in range(256)])
+    indices = ImageChops.add(image.point(base), step)
+    return map_indices(indices.tobytes(), chars)
+
+
+def pixels_to_ascii(image, chars=ASCII_CHARS, dither=None):
+    """Convert the pixels of a grayscale image to a flat string of characters
+
+    ``dither`` selects an optional dithering mode from DITHER_MODES.
+    """
+    with instrument.span('glyph_mapping') as span:
+        span.count(cells=image.width * image.height)
+        if not dither:
+            return map_pixels(image.tobytes(), chars)
+        if dither == 'floyd-steinberg':
+            return _floyd_steinberg(image, chars)
+        if dither == 'atkinson':
+            return _atkinson(image, chars)
+        if dither == 'bayer':
+            return _bayer(image, chars)
+        raise ValueError(f"Unknown dither mode: {dither} (choose from {', '.join(DITHER_MODES)})")
+
+
+def split_planes(image, grid):
+    """Split a grayscale image into one plane per position of a grid of cells
+
+    The image holds ``(columns * gx, rows * gy)`` pixels for a ``(gx, gy)``
+    grid. Returns ``gx * gy`` byte strings of ``columns * rows`` values, row
+    by row within the cell; plane ``j * gx + i`` holds the pixel at column
+    ``i`` and row ``j`` of every cell.
+    """
+    grid_x, grid_y = grid
+    rows = image.height // grid_y
+    # Viewed this way, each row holds the gy pixel rows of one row of cells
+    bands = Image.frombytes('L', (image.width * grid_y, rows), image.tobytes())
+    planes = []
+    for j in range(grid_y):
+        band = bands.crop((j * image.width, 0, (j + 1) * image.width, rows)).tobytes()
+        planes.extend(band[i::grid_x] for i in range(grid_x))
+    return planes
+
+
+def join_rows(ascii_str, width, trailing_newline=False):
+    """Split a flat character string into rows of ``width`` characters"""
+    if not ascii_str or width <= 0:
+        return ''
+    with instrument.span('row_joining') as span:
+        span.count(cells=len(ascii_str))
+        art = '\n'.join([ascii_str[i:i + width] for i in range(0, len(ascii_str), width)])
+        return art + '\n' if trailing_newline else art
+
+
+def frame_to_ascii(image, chars=ASCII_CHARS, trailing_newline=False, dither=None):
+    """Convert an already sized grayscale image to rows of ASCII art"""
+    if image.mode != 'L':
+        image = grayscale(image)
+    return join_rows(pixels_to_ascii(image, chars, dither), image.width, trailing_newline)
+
+
+def image_to_ascii(image, width=100, chars=ASCII_CHARS, dither=None):
+    """Resize, grayscale and convert a PIL image to ASCII art"""
+    return frame_to_ascii(grayscale(resize_image(image, width)), chars, dither=dither)
+
+
+def open_image(image_path):
+    """Open and decode an image file"""
+    with instrument.span('open') as span:
+        image = Image.open(image_path)
+        try:
+            image.load()
+        except BaseException:
+            image.close()
+            raise
+        span.count(bytes=os.path.getsize(image_path), pixels=image.width * image.height)
+        return image
+
+
+def convert_file(image_path, width=100, chars=ASCII_CHARS, dither=None):
+    """Open an image file and convert it to ASCII art"""
+    with open_image(image_path) as image:
+        return image_to_ascii(image, width, chars, dither)
+
+
+def save_ascii(filename, ascii_art):
+    """Write ASCII art to a text file ('-' for stdout; .gz, .bz2, .xz and .zst are compressed)"""
+    import output
+    with instrument.span('write') as span:
+        span.count(bytes=output.write_text(filename, ascii_art))
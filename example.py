@@ -1,151 +1,66 @@
 """
 Canvas - A collection of hand-made ASCII art
+
+The pieces live in a packed library file (see library.py) that is
+memory-mapped on first use, so only the pieces that are read get decoded.
 """
 
-# Dictionary of ASCII art pieces
-ASCII_ART = {
-    "cat": """
-    /\\_/\\  
-   ( o.o ) 
-    > ^ <
-   /|   |\\
-  (_|   |_)
-""",
-    
-    "dog": """
-    / \\__
-   (    @\\___
-   /         O
-  /   (_____/
- /_____/   U
-""",
-    
-    "house": """
-       /\\
-      /  \\
-     /    \\
-    /______\\
-    |  __  |
-    | |  | |
-    | |__| |
-    |______|
-""",
-    
-    "tree": """
-       ^
-      ^^^
-     ^^^^^
-    ^^^^^^^
-   ^^^^^^^^^
-      |||
-      |||
-""",
-    
-    "heart": """
-  **   **
- **** ****
-***********
- *********
-  *******
-   *****
-    ***
-""",
-    
-    "rocket": """
-       /\\
-      /  \\
-     |    |
-     | ** |
-     |    |
-    /| || |\\
-   / | || | \\
-     /____\\
-     |    |
-    /|    |\\
-   /========\\
-  ////////////
-""",
-    
-    "skeleton": """
-      .-.
-     (o.o)
-      |=|
-     __|__
-   //.=|=.\\\\
-  // .=|=. \\\\
-  \\\\ .=|=. //
-   \\\\(_=_)//
-    (:| |:)
-     || ||
-     () ()
-     || ||
-     || ||
-    ==' '==
-""",
-    
-    "diamond": """
-       *   
-      *** 
-     *****
-    *******
-   *********
-    *******
-     *****
-      ***
-       *
-""",
-    
-    "flower": """
-     .--.
-   /  - \\
-  | . . |
-   \\ ~ /
-    | |
-    | |
-   _|_|_
-""",
-    
-    "coffee": """
-       )  (
-      (   ) )
-       ) ( (
-     _______)_
-  .-'---------|  
- ( C|/\\/\\/\\/\\/|
-  '-./\\/\\/\\/\\/|
-    '_________'
-     '-------'
-""",
-
-    "dragon": """
-\  ___ \`'.            /|                 .--. 
- ' |--.\  \           ||                 |__| 
- | |    \  '          ||                 .--. 
- | |     |  '         ||  __        __   |  | 
- | |     |  | _    _  ||/'__ '.  .:--.'. |  | 
- | |     ' .'| '  / | |:\`  '. '/ |   \ ||  | 
- | |___.' /'.' | .' | ||     | |\`" __ | ||  | 
-/_______.'/ /  | /  | ||\    / ' .'.''| ||__| 
-\_______|/ |   \`'.  | |/\\..' / / /   | |_    
-           '   .'|  '/'  \`'-'\`  \ \._,\ '/    
-            \`-'  \`--'            \`--'  \`" `
-""",
-}
+import os
+import sys
+
+import library
+
+
+LIBRARY_FILE = 'art_library.afl'
+
+_library = None
+
+
+def library_path():
+    """Return the art library file, honouring ASCIIFORGE_LIBRARY"""
+    if os.environ.get('ASCIIFORGE_LIBRARY'):
+        return os.environ['ASCIIFORGE_LIBRARY']
+    # PyInstaller unpacks bundled data files to sys._MEIPASS
+    base = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, LIBRARY_FILE)
+
+
+def get_library():
+    """Return the memory-mapped art library, opening it on first use"""
+    global _library
+    if _library is None:
+        _library = library.ArtLibrary(library_path())
+    return _library
 
 
 def get_art(name):
     """Get ASCII art by name"""
-    return ASCII_ART.get(name.lower())
+    return get_library().get(name.lower())
 
 
 def list_art():
     """List all available ASCII art names"""
-    return list(ASCII_ART.keys())
+    return list(get_library())
 
 
 def get_all_art():
-    """Get all ASCII art pieces"""
-    return ASCII_ART
+    """Get all ASCII art pieces as a read-only name to art mapping
+
+    Pieces are decoded lazily as the mapping is read.
+    """
+    return get_library()
+
+
+def add_art(name, art, tags=()):
+    """Append a piece of ASCII art to the library"""
+    get_library().add(name, art, tags)
+
+
+def __getattr__(name):
+    # ASCII_ART used to be a module-level dict
+    if name == 'ASCII_ART':
+        return get_library()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
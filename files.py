@@ -0,0 +1,19 @@
+"""
+Files module for AsciiForge - Permissions for files replaced atomically
+
+Files that must never be seen half-written are written to a temporary file
+from ``tempfile.mkstemp`` in the same directory and moved over the target
+with ``os.replace``. mkstemp creates that file readable by its owner only,
+so ``file_mode`` gives the permissions the result should have instead.
+"""
+import os
+
+
+def file_mode(path):
+    """Permissions for a replacement of ``path``: its own, or those a new file would get"""
+    try:
+        return os.stat(path).st_mode & 0o777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
@@ -0,0 +1,188 @@
+"""
+Glyphs module for AsciiForge - Structure-aware glyph matching
+
+Brightness mapping picks a character from the average luminance of a cell
+alone, so edges and thin lines dissolve into noise. Here every glyph of a
+monospace font is rasterized once and reduced to a GRID of ink coverage
+values; each character cell of the source image is reduced to the same grid
+and takes the glyph at the smallest (squared euclidean) distance.
+
+The glyph feature matrix is built once per font, size and glyph set, kept in
+memory and stored in the conversion cache, so later runs just read it back.
+Matching runs on whole images: each grid position is one Pillow plane
+holding that feature for every cell, and a glyph's score for all cells is a
+weighted sum of those planes. Since |f - g|^2 = |f|^2 - 2 f.g + |g|^2 and
+|f|^2 is the same for every glyph, the nearest glyph minimises |g|^2 - 2 f.g.
+"""
+import hashlib
+import json
+from collections import namedtuple
+from functools import lru_cache
+from PIL import Image, ImageChops, ImageDraw, ImageFont, ImageMath
+import PIL
+
+import cache
+import converter
+import instrument
+
+
+# Printable ASCII, space first so blank cells stay blank
+GLYPHS = ''.join(chr(code) for code in range(32, 127))
+
+# Coverage samples per glyph and per source cell (columns, rows)
+GRID = (3, 4)
+
+DEFAULT_FONT_SIZE = 16
+
+# Tried in order when no font is given; Pillow's built-in font is the fallback
+MONOSPACE_FONTS = ('DejaVuSansMono.ttf', 'consola.ttf', 'Menlo.ttc', 'cour.ttf',
+                   'LiberationMono-Regular.ttf', 'Courier New.ttf')
+
+# Each score is packed as score * INDEX_RANGE + glyph index
+INDEX_RANGE = 256
+
+# ImageMath.eval was renamed in Pillow 10.3
+_EVAL = getattr(ImageMath, 'unsafe_eval', None) or ImageMath.eval
+
+GlyphMatrix = namedtuple('GlyphMatrix', ['chars', 'features'])
+
+
+def load_font(font=None, size=DEFAULT_FONT_SIZE):
+    """Load a font file, or the first available monospace font"""
+    if font:
+        return ImageFont.truetype(font, size)
+    for name in MONOSPACE_FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow < 10.1 has a single bitmap font
+        return ImageFont.load_default()
+
+
+def rasterize(font, chars=GLYPHS):
+    """Draw each glyph white on black in a common character cell"""
+    boxes = [font.getbbox(char) for char in chars]
+    cell = (max(1, max(box[2] for box in boxes)), max(1, max(box[3] for box in boxes)))
+    bitmaps = []
+    for char in chars:
+        bitmap = Image.new('L', cell, 0)
+        ImageDraw.Draw(bitmap).text((0, 0), char, fill=255, font=font)
+        bitmaps.append(bitmap)
+    return bitmaps
+
+
+def build_matrix(font, chars=GLYPHS):
+    """Return the GlyphMatrix of ``chars`` drawn in ``font``
+
+    Features are scaled so the densest sample of any glyph is 255, i.e. a
+    solid dark region matches the heaviest glyph. Glyphs whose features
+    duplicate an earlier glyph's are dropped.
+    """
+    samples = [list(bitmap.resize(GRID, Image.BOX).tobytes()) for bitmap in rasterize(font, chars)]
+    peak = max(max(sample) for sample in samples) or 1
+    kept, features, seen = [], [], set()
+    for char, sample in zip(chars, samples):
+        vector = tuple(round(value * 255 / peak) for value in sample)
+        if vector not in seen:
+            seen.add(vector)
+            kept.append(char)
+            features.append(vector)
+    if len(kept) > INDEX_RANGE:
+        raise ValueError(f"At most {INDEX_RANGE} distinct glyphs can be matched, got {len(kept)}")
+    return GlyphMatrix(''.join(kept), features)
+
+
+def _matrix_key(store, font, size, chars):
+    path = getattr(font, 'path', None)
+    source = store.file_digest(path) if isinstance(path, str) else 'pillow-default'
+    params = {'font': source, 'size': size, 'chars': chars, 'grid': GRID, 'pillow': PIL.__version__}
+    return 'glyphs-' + hashlib.blake2b(json.dumps(params, sort_keys=True).encode('utf-8'),
+                                       digest_size=20).hexdigest()
+
+
+@lru_cache(maxsize=8)
+def glyph_matrix(font=None, size=DEFAULT_FONT_SIZE, chars=GLYPHS):
+    """Return the GlyphMatrix for a font file (None for the default font)
+
+    Built matrices are stored in the conversion cache and read back on
+    later runs.
+    """
+    loaded = load_font(font, size)
+    store = cache.default_cache()
+    key = _matrix_key(store, loaded, size, chars)
+    stored = store.get(key)
+    if stored is not None:
+        data = json.loads(stored)
+        return GlyphMatrix(data['chars'], [tuple(vector) for vector in data['features']])
+    with instrument.span('glyph_rasterize') as span:
+        span.count(glyphs=len(chars))
+        matrix = build_matrix(loaded, chars)
+    try:
+        store.put(key, json.dumps({'chars': matrix.chars, 'features': matrix.features}))
+    except OSError:
+        pass  # an unwritable cache must never break a conversion
+    return matrix
+
+
+def cell_planes(image, size, box=None, invert=False):
+    """Sample a grayscale image into one 'I' plane per GRID position
+
+    ``size`` is the (columns, rows) character grid and ``box`` an optional
+    source region as for ``Image.resize``. Ink is dark by default; with
+    ``invert`` light pixels are ink, as for a drawing on a black background.
+    """
+    columns, rows = size
+    grid_x, grid_y = GRID
+    with instrument.span('glyph_sampling') as span:
+        span.count(cells=columns * rows)
+        samples = image.resize((columns * grid_x, rows * grid_y), Image.BOX, box=box)
+        if not invert:
+            samples = ImageChops.invert(samples)
+        return [Image.frombytes('L', size, plane).convert('I')
+                for plane in converter.split_planes(samples, GRID)]
+
+
+def match_planes(planes, matrix):
+    """Return the flat string of nearest glyphs for sampled cell planes"""
+    with instrument.span('glyph_matching') as span:
+        span.count(cells=planes[0].width * planes[0].height, glyphs=len(matrix.chars))
+        env = {f'p{k}': plane for k, plane in enumerate(planes)}
+        best = None
+        for index, vector in enumerate(matrix.features):
+            # (|g|^2 - 2 f.g) * INDEX_RANGE + index, as one weighted sum of planes
+            constant = sum(value * value for value in vector) * INDEX_RANGE + index
+            terms = [f'p{k} * {-2 * value * INDEX_RANGE}' for k, value in enumerate(vector) if value]
+            score = ' + '.join(terms + [str(constant)])
+            if best is None:
+                # Lift a constant score to an image
+                best = _EVAL(f'p0 * 0 + {score}', **env)
+            else:
+                env['best'] = best
+                best = _EVAL(f'min(best, {score})', **env)
+        indices = _EVAL(f'best & {INDEX_RANGE - 1}', best=best).convert('L')
+        return converter.map_indices(indices.tobytes(), matrix.chars)
+
+
+def pixels_to_glyphs(image, size, matrix, box=None, invert=False):
+    """Match every cell of a grayscale image, as a flat string of glyphs"""
+    return match_planes(cell_planes(image, size, box, invert), matrix)
+
+
+def image_to_glyphs(image, width=100, font=None, font_size=DEFAULT_FONT_SIZE, chars=GLYPHS,
+                    invert=False, trailing_newline=False):
+    """Convert a PIL image to ASCII art by glyph shape rather than brightness"""
+    size = converter.target_size(image.size, width)
+    if size[0] <= 0 or size[1] <= 0:
+        return ''
+    matrix = glyph_matrix(font, font_size, chars)
+    glyphs = pixels_to_glyphs(converter.grayscale(image), size, matrix, invert=invert)
+    return converter.join_rows(glyphs, size[0], trailing_newline)
+
+
+def convert_file(image_path, width=100, font=None, font_size=DEFAULT_FONT_SIZE, chars=GLYPHS, invert=False):
+    """Open an image file and convert it by glyph shape"""
+    with converter.open_image(image_path) as image:
+        return image_to_glyphs(image, width, font, font_size, chars, invert)
@@ -1,9 +1,13 @@
 import tkinter as tk
-from tkinter import messagebox, scrolledtext, filedialog
-import subprocess
-import sys
-import example
-import canvas
+from tkinter import messagebox, filedialog, ttk
+import console
+
+# The art library, the drawing canvas and the conversion worker (which pulls
+# in PIL) are imported on first use so the main window paints quickly.
+
+# Art viewer: names listed before searching, and results per search
+LIST_LIMIT = 1000
+SEARCH_LIMIT = 200
 
 
 class AsciiForgeApp:
@@ -16,6 +20,8 @@ class AsciiForgeApp:
         self.root.configure(bg='#1e1e1e')
         # currently-selected image path (set via Select Image button)
         self.selected_image_path = None
+        # in-flight background conversion, if any
+        self.conversion_task = None
         
         # Create main container
         self.create_header()
@@ -62,7 +68,7 @@ class AsciiForgeApp:
         }
         
         # Button 1: Convert Image to ASCII
-        btn1 = tk.Button(
+        self.convert_btn = tk.Button(
             button_frame,
             text="📷 Convert Image to ASCII Art",
             bg='#0078d4',
@@ -70,7 +76,7 @@ class AsciiForgeApp:
             command=self.convert_image,
             **button_config
         )
-        btn1.pack(pady=8)
+        self.convert_btn.pack(pady=8)
 
         # Small Select Image button (opens file dialog) and label showing path
         select_btn = tk.Button(
@@ -99,6 +105,35 @@ class AsciiForgeApp:
             justify='left'
         )
         path_label.pack(pady=(0, 8))
+
+        # Conversion progress bar, status text and cancel button
+        progress_frame = tk.Frame(button_frame, bg='#1e1e1e')
+        progress_frame.pack(pady=(0, 8))
+        self.progress_var = tk.DoubleVar(value=0.0)
+        ttk.Progressbar(
+            progress_frame,
+            variable=self.progress_var,
+            maximum=1.0,
+            length=200
+        ).pack(side=tk.LEFT, padx=(0, 5))
+        self.cancel_btn = tk.Button(
+            progress_frame,
+            text="Cancel",
+            command=self.cancel_conversion,
+            bg='#4a4a4a',
+            fg='white',
+            font=('Arial', 9),
+            state=tk.DISABLED
+        )
+        self.cancel_btn.pack(side=tk.LEFT)
+        self.status_var = tk.StringVar(value="")
+        tk.Label(
+            button_frame,
+            textvariable=self.status_var,
+            font=('Arial', 9),
+            bg='#1e1e1e',
+            fg='#cccccc'
+        ).pack()
         
         # Button 2: View Predefined ASCII Art
         btn2 = tk.Button(
@@ -149,15 +184,13 @@ class AsciiForgeApp:
         )
         label.pack(fill=tk.X, pady=(0, 5))
         
-        # Scrolled text widget for output
-        self.output_text = scrolledtext.ScrolledText(
+        # Output console; writes are batched and only visible lines are drawn
+        self.output_text = console.OutputConsole(
             output_frame,
             height=12,
             font=('Courier', 9),
             bg='#0d0d0d',
-            fg='#00ff00',
-            insertbackground='white',
-            wrap=tk.WORD
+            fg='#00ff00'
         )
         self.output_text.pack(fill=tk.BOTH, expand=True)
         
@@ -178,41 +211,76 @@ class AsciiForgeApp:
     
     def write_output(self, text):
         """Write text to output area"""
-        self.output_text.insert(tk.END, text)
-        self.output_text.see(tk.END)
-        self.output_text.update()
+        self.output_text.write(text)
     
     def clear_output(self):
         """Clear the output area"""
-        self.output_text.delete('1.0', tk.END)
+        self.output_text.clear()
     
     def convert_image(self):
-        """Convert image to ASCII art"""
+        """Convert image to ASCII art on a background thread"""
+        if self.conversion_task and self.conversion_task.running:
+            return
+        import worker
+        if not self.selected_image_path:
+            self.select_image()
+            if not self.selected_image_path:
+                return
         self.write_output("\n=== Image to ASCII Converter ===\n")
-        self.write_output("Launching image converter...\n")
+        self.write_output(f"Converting {self.selected_image_path}...\n")
+        self.convert_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.progress_var.set(0.0)
+        self.conversion_task = worker.BackgroundTask(
+            self.root,
+            worker.convert_image_file,
+            self.selected_image_path,
+            on_progress=self.on_conversion_progress,
+            on_done=self.on_conversion_done,
+            on_error=self.on_conversion_error,
+            on_cancel=self.on_conversion_cancelled
+        ).start()
+
+    def cancel_conversion(self):
+        """Cancel the running conversion"""
+        if self.conversion_task:
+            self.conversion_task.cancel()
+            self.status_var.set("Cancelling...")
+
+    def on_conversion_progress(self, fraction, message):
+        """Update the progress bar from the conversion worker"""
+        self.progress_var.set(fraction)
+        self.status_var.set(message)
+
+    def on_conversion_done(self, ascii_art):
+        """Show and save a finished conversion"""
+        self.finish_conversion("Done")
+        self.write_output(ascii_art + "\n")
         try:
-            # If a path was selected, feed it to the converter via stdin so the
-            # existing `image-to-ascii.py` script receives the path when it
-            # prompts for input. Capture stdout/stderr and display in the UI.
-            if self.selected_image_path:
-                proc = subprocess.run(
-                    [sys.executable, 'image-to-ascii.py'],
-                    input=self.selected_image_path + '\n',
-                    text=True,
-                    capture_output=True
-                )
-            else:
-                proc = subprocess.run([sys.executable, 'image-to-ascii.py'], capture_output=True, text=True)
+            with open("ascii_image.txt", "w") as f:
+                f.write(ascii_art)
+            self.write_output("ASCII art written to ascii_image.txt\n")
+        except OSError as e:
+            self.write_output(f"Could not write ascii_image.txt: {e}\n")
+        self.write_output("Image conversion completed.\n")
 
-            # Write process output to the output console
-            if proc.stdout:
-                self.write_output(proc.stdout + "\n")
-            if proc.stderr:
-                self.write_output("Errors:\n" + proc.stderr + "\n")
-            self.write_output("Image conversion completed.\n")
-        except Exception as e:
-            self.write_output(f"Error: {str(e)}\n")
-            messagebox.showerror("Error", f"Failed to launch image converter: {str(e)}")
+    def on_conversion_error(self, error):
+        """Report a failed conversion"""
+        self.finish_conversion("Failed")
+        self.write_output(f"Error: {str(error)}\n")
+        messagebox.showerror("Error", f"Failed to convert image: {str(error)}")
+
+    def on_conversion_cancelled(self):
+        """Report a cancelled conversion"""
+        self.finish_conversion("Cancelled")
+        self.write_output("Image conversion cancelled.\n")
+
+    def finish_conversion(self, status):
+        """Reset the conversion controls"""
+        self.convert_btn.config(state=tk.NORMAL)
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.status_var.set(status)
+        self.conversion_task = None
 
     def select_image(self):
         """Open a file dialog to select an image and show its path in the UI"""
@@ -227,12 +295,15 @@ class AsciiForgeApp:
     
     def view_predefined_art(self):
         """View predefined ASCII art pieces"""
+        import example
+        import search
+        import worker
         self.write_output("\n=== Predefined ASCII Art Library ===\n")
         
         # Create a new window for selection
         art_window = tk.Toplevel(self.root)
         art_window.title("Select ASCII Art")
-        art_window.geometry("400x500")
+        art_window.geometry("400x560")
         art_window.configure(bg='#2d2d2d')
         
         # Title
@@ -245,6 +316,28 @@ class AsciiForgeApp:
         )
         title.pack(pady=10)
         
+        # Incremental search box: names, tags, w<N/h>N filters, "text"
+        search_var = tk.StringVar()
+        search_entry = tk.Entry(
+            art_window,
+            textvariable=search_var,
+            font=('Arial', 11),
+            bg='#1e1e1e',
+            fg='#ffffff',
+            insertbackground='white'
+        )
+        search_entry.pack(fill=tk.X, padx=20)
+        search_entry.focus_set()
+        count_var = tk.StringVar()
+        tk.Label(
+            art_window,
+            textvariable=count_var,
+            font=('Arial', 9),
+            bg='#2d2d2d',
+            fg='#cccccc',
+            anchor='w'
+        ).pack(fill=tk.X, padx=20)
+
         # Listbox for art selection
         listbox_frame = tk.Frame(art_window, bg='#2d2d2d')
         listbox_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -264,10 +357,47 @@ class AsciiForgeApp:
         listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.config(command=listbox.yview)
         
-        # Populate listbox
-        art_names = example.list_art()
-        for name in art_names:
-            listbox.insert(tk.END, name)
+        # Populate listbox, filtered by the search box as the user types.
+        # The search index of a large library takes a while to build, so
+        # queries wait for it on a background thread.
+        index_ready = []
+
+        def update_results(*_):
+            query = search_var.get().strip()
+            if query and not index_ready:
+                count_var.set("Indexing...")
+                return
+            if query:
+                names = [result.name for result in search.search(query, SEARCH_LIMIT)]
+                count_var.set(f"{len(names)} match(es)")
+            else:
+                names = example.list_art()
+                total = len(names)
+                names = names[:LIST_LIMIT]
+                count_var.set(f"{total} pieces" if total <= LIST_LIMIT
+                              else f"Showing {LIST_LIMIT} of {total} pieces - type to search")
+            listbox.delete(0, tk.END)
+            listbox.insert(tk.END, *names)
+            if names:
+                listbox.selection_set(0)
+
+        def on_indexed(_):
+            index_ready.append(True)
+            if art_window.winfo_exists():
+                update_results()
+
+        def on_index_error(error):
+            if art_window.winfo_exists():
+                count_var.set(f"Search unavailable: {error}")
+
+        search_var.trace_add('write', update_results)
+        update_results()
+        worker.BackgroundTask(
+            self.root,
+            lambda task: search.default_index(),
+            on_done=on_indexed,
+            on_error=on_index_error
+        ).start()
         
         # Display button
         def display_selected():
@@ -284,6 +414,9 @@ class AsciiForgeApp:
                     messagebox.showerror("Error", "ASCII art not found.")
             else:
                 messagebox.showwarning("Warning", "Please select an ASCII art piece.")
+
+        search_entry.bind('<Return>', lambda event: display_selected())
+        listbox.bind('<Double-Button-1>', lambda event: display_selected())
         
         display_btn = tk.Button(
             art_window,
@@ -299,9 +432,11 @@ class AsciiForgeApp:
     
     def create_ascii_art(self):
         """Launch the drawing canvas"""
+        import canvas
         self.write_output("\n=== ASCII Art Drawing Canvas ===\n")
         self.write_output("Launching drawing canvas window...\n")
         self.write_output("Draw with your mouse and convert to ASCII art!\n")
+        self.output_text.flush()
         try:
             canvas.interactive_canvas()
             self.write_output("Canvas closed.\n")
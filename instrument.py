@@ -0,0 +1,203 @@
+"""
+Instrument module for AsciiForge - Per-stage timing and profiling hooks
+
+Conversion code wraps each stage in ``span``:
+
+    with instrument.span('resize') as s:
+        small = image.resize(size)
+        s.count(pixels=image.width * image.height)
+
+While no hook is registered ``span`` returns a shared no-op object, so the
+cost of instrumentation is one function call and an attribute check per
+stage. Register a callback with ``add_hook`` to receive finished spans, or
+use ``capture`` to collect them (optionally with cProfile and tracemalloc)
+into a ``Trace`` that serialises to JSON. The profilers are imported only
+when a trace asks for them, which keeps this module cheap to import.
+"""
+import json
+import threading
+import time
+
+
+_hooks = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Span:
+    """A timed stage with optional counters (pixels, bytes, ...)"""
+
+    __slots__ = ('name', 'parent', 'start', 'duration', 'counters')
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.start = 0.0
+        self.duration = 0.0
+        self.counters = {}
+
+    def count(self, **counters):
+        """Add to this span's counters"""
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration = time.perf_counter() - self.start
+        _local.stack.pop()
+        for hook in list(_hooks):
+            hook(self)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'parent': self.parent,
+            'start': self.start,
+            'duration': self.duration,
+            'counters': dict(self.counters),
+        }
+
+
+class _NullSpan:
+    """Stand-in returned by ``span`` when nothing is listening"""
+
+    __slots__ = ()
+
+    def count(self, **counters):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """Return a context manager timing the stage ``name``"""
+    if not _hooks:
+        return NULL_SPAN
+    return Span(name)
+
+
+def enabled():
+    """Whether any hook is currently receiving spans"""
+    return bool(_hooks)
+
+
+def add_hook(callback):
+    """Call ``callback(span)`` for every finished span"""
+    with _lock:
+        _hooks.append(callback)
+
+
+def remove_hook(callback):
+    """Stop calling a hook registered with ``add_hook``"""
+    with _lock:
+        if callback in _hooks:
+            _hooks.remove(callback)
+
+
+class Trace:
+    """Spans, and optionally profiler and memory statistics, from ``capture``"""
+
+    def __init__(self, profile=False, memory=False, top=25):
+        self.spans = []
+        self.top = top
+        self.profiler = None
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        self.memory = memory
+        self.memory_stats = None
+        self.started = None
+        self.elapsed = 0.0
+
+    def _record(self, finished):
+        self.spans.append(finished)
+
+    def __enter__(self):
+        add_hook(self._record)
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        if self.profiler:
+            self.profiler.enable()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        if self.profiler:
+            self.profiler.disable()
+        if self.memory:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.memory_stats = {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'top': [{'location': str(stat.traceback), 'bytes': stat.size, 'blocks': stat.count}
+                        for stat in snapshot.statistics('lineno')[:self.top]],
+            }
+        remove_hook(self._record)
+
+    def totals(self):
+        """Total duration and counters per stage name"""
+        totals = {}
+        for s in self.spans:
+            entry = totals.setdefault(s.name, {'calls': 0, 'duration': 0.0, 'counters': {}})
+            entry['calls'] += 1
+            entry['duration'] += s.duration
+            for key, value in s.counters.items():
+                entry['counters'][key] = entry['counters'].get(key, 0) + value
+        return totals
+
+    def profile_stats(self):
+        """The hottest functions by cumulative time, if profiling was on"""
+        if not self.profiler:
+            return None
+        import io
+        import pstats
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (calls, _, tottime, cumtime, _) in stats.stats.items():
+            rows.append({'function': f"{filename}:{line}({function})", 'calls': calls,
+                         'tottime': tottime, 'cumtime': cumtime})
+        rows.sort(key=lambda row: row['cumtime'], reverse=True)
+        return rows[:self.top]
+
+    def to_dict(self):
+        origin = self.started or 0.0
+        spans = []
+        for s in self.spans:
+            record = s.to_dict()
+            record['start'] -= origin
+            spans.append(record)
+        return {
+            'elapsed': self.elapsed,
+            'stages': self.totals(),
+            'spans': spans,
+            'profile': self.profile_stats(),
+            'memory': self.memory_stats,
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+def capture(profile=False, memory=False, top=25):
+    """Collect spans while the returned Trace is active as a context manager"""
+    return Trace(profile, memory, top)
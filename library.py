@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Library module for AsciiForge - Packed, memory-mapped ASCII art library
+
+A library file holds the UTF-8 text of every piece back to back, followed by
+an index segment (name -> offset/length, dimensions and tags) and a small
+footer pointing at that index:
+
+    header | piece ... piece | index | footer
+                             | piece ... piece | index | footer    (appended)
+
+Appending writes the new pieces, an index segment for just those pieces that
+links to the previous one, and a new footer, so existing bytes are never
+rewritten. Readers follow the chain from the last footer; a later piece with
+the same name replaces an earlier one. The file is memory-mapped and each
+piece is decoded only when it is asked for. ``compact`` rewrites a library
+with a single index once many appends have accumulated.
+
+    python library.py list
+    python library.py add NAME FILE [-t TAG ...]
+    python library.py import DIR_OR_FILES ... [-t TAG ...]
+    python library.py export DIR
+    python library.py compact
+"""
+import argparse
+import glob
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from collections import namedtuple
+from collections.abc import Mapping
+
+import files
+
+
+MAGIC = b'AFLIB\0'
+VERSION = 1
+HEADER = struct.Struct('<6sH')
+# magic, piece count, names blob size, tags blob size, previous index offset
+INDEX_HEADER = struct.Struct('<4sIIIQ')
+INDEX_MAGIC = b'AFIX'
+# offset, length, width, height of one piece
+ENTRY = struct.Struct('<QIII')
+# offset of the newest index segment
+FOOTER = struct.Struct('<Q4s')
+FOOTER_MAGIC = b'AFFT'
+
+LIBRARY_SUFFIX = '.afl'
+
+ArtInfo = namedtuple('ArtInfo', ['name', 'width', 'height', 'tags', 'size'])
+
+
+class LibraryError(ValueError):
+    """Raised for files that are not valid art libraries"""
+
+
+def dimensions(text):
+    """Return the (width, height) in characters of a piece of art"""
+    body = text.strip('\n')
+    lines = body.split('\n') if body else []
+    return max(map(len, lines), default=0), len(lines)
+
+
+def _check_name(name):
+    name = name.strip().lower()
+    if not name or '\n' in name:
+        raise ValueError(f"Invalid art name: {name!r}")
+    return name
+
+
+def _check_tags(tags):
+    tags = [tag.strip().lower() for tag in tags if tag.strip()]
+    for tag in tags:
+        if ',' in tag or '\n' in tag:
+            raise ValueError(f"Invalid tag: {tag!r}")
+    return ','.join(tags)
+
+
+def _read_footer(f):
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size < HEADER.size + FOOTER.size:
+        raise LibraryError(f"{f.name}: file too small to be an art library")
+    f.seek(0)
+    magic, version = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise LibraryError(f"{f.name}: not an AsciiForge art library (or unsupported version)")
+    f.seek(size - FOOTER.size)
+    index_offset, footer_magic = FOOTER.unpack(f.read(FOOTER.size))
+    if footer_magic != FOOTER_MAGIC:
+        raise LibraryError(f"{f.name}: missing index footer (truncated or corrupt)")
+    return index_offset, size
+
+
+def append_pieces(path, pieces):
+    """Append ``(name, text, tags)`` pieces to a library, creating it if needed
+
+    Returns the number of pieces written. On failure the file is truncated
+    back to its previous size, leaving the existing library intact.
+    """
+    exists = os.path.exists(path) and os.path.getsize(path) > 0
+    with open(path, 'r+b' if exists else 'w+b') as f:
+        if exists:
+            previous, original_size = _read_footer(f)
+        else:
+            f.write(HEADER.pack(MAGIC, VERSION))
+            previous, original_size = 0, 0
+        f.seek(0, os.SEEK_END)
+        try:
+            entries, names, tag_fields = [], [], []
+            for name, text, tags in pieces:
+                name = _check_name(name)
+                data = text.encode('utf-8')
+                offset = f.tell()
+                f.write(data)
+                entries.append(ENTRY.pack(offset, len(data), *dimensions(text)))
+                names.append(name)
+                tag_fields.append(_check_tags(tags))
+            names_blob = '\n'.join(names).encode('utf-8')
+            tags_blob = '\n'.join(tag_fields).encode('utf-8')
+            index_offset = f.tell()
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(entries), len(names_blob), len(tags_blob), previous))
+            f.write(b''.join(entries))
+            f.write(names_blob)
+            f.write(tags_blob)
+            f.write(FOOTER.pack(index_offset, FOOTER_MAGIC))
+        except BaseException:
+            f.truncate(original_size)
+            raise
+    return len(entries)
+
+
+def create_library(path, pieces):
+    """Write a new library containing ``(name, text, tags)`` pieces"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.tmp-', suffix=LIBRARY_SUFFIX, dir=directory)
+    os.close(fd)
+    try:
+        append_pieces(tmp, pieces)
+        os.chmod(tmp, files.file_mode(path))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class ArtLibrary(Mapping):
+    """Read-only mapping of art name to text backed by a memory-mapped library
+
+    Only the index is parsed on open; piece text is decoded on access.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._map = None
+        self._entries = {}
+        self.reload()
+
+    def reload(self):
+        """Re-open the file, picking up pieces appended since it was opened"""
+        self.close()
+        self._file = open(self.path, 'rb')
+        try:
+            index_offset, size = _read_footer(self._file)
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._entries = self._read_index(index_offset, size)
+        except BaseException:
+            self.close()
+            raise
+
+    def _read_index(self, index_offset, size):
+        segments = []
+        while index_offset:
+            if index_offset + INDEX_HEADER.size > size:
+                raise LibraryError(f"{self.path}: index offset out of range")
+            magic, count, names_size, tags_size, previous = INDEX_HEADER.unpack_from(self._map, index_offset)
+            if magic != INDEX_MAGIC or previous >= index_offset:
+                raise LibraryError(f"{self.path}: corrupt index segment at {index_offset}")
+            segments.append((index_offset + INDEX_HEADER.size, count, names_size, tags_size))
+            index_offset = previous
+
+        entries = {}
+        for start, count, names_size, tags_size in reversed(segments):
+            if not count:
+                continue
+            names_at = start + count * ENTRY.size
+            tags_at = names_at + names_size
+            records = ENTRY.iter_unpack(self._map[start:names_at])
+            names = self._map[names_at:tags_at].decode('utf-8').split('\n')
+            tags = self._map[tags_at:tags_at + tags_size].decode('utf-8').split('\n')
+            for name, tag_field, record in zip(names, tags, records):
+                entries[name] = record + (tag_field,)
+        return entries
+
+    def close(self):
+        """Release the memory map and file handle"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, name):
+        offset, length, _, _, _ = self._entries[name]
+        return self._map[offset:offset + length].decode('utf-8')
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def info(self, name):
+        """Return the ArtInfo for ``name`` without decoding its text"""
+        _, length, width, height, tags = self._entries[name]
+        return ArtInfo(name, width, height, tuple(tags.split(',')) if tags else (), length)
+
+    def add(self, name, text, tags=()):
+        """Append one piece to the library file and reload"""
+        self.add_many([(name, text, tags)])
+
+    def add_many(self, pieces):
+        """Append ``(name, text, tags)`` pieces to the library file and reload"""
+        # Unmap first: Windows refuses to extend a file that is mapped
+        self.close()
+        try:
+            return append_pieces(self.path, pieces)
+        finally:
+            self.reload()
+
+    def segments(self):
+        """Number of index segments, i.e. appends since the last compaction"""
+        count = 0
+        index_offset = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)[0]
+        while index_offset:
+            count += 1
+            index_offset = INDEX_HEADER.unpack_from(self._map, index_offset)[4]
+        return count
+
+
+def compact(path):
+    """Rewrite a library with a single index, dropping replaced pieces"""
+    with ArtLibrary(path) as lib:
+        pieces = [(name, lib[name], lib.info(name).tags) for name in lib]
+    create_library(path, pieces)
+    return len(pieces)
+
+
+def _read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def main(argv=None):
+    import example
+
+    parser = argparse.ArgumentParser(description='Manage an AsciiForge art library')
+    parser.add_argument('-L', '--library', default=example.library_path(),
+                        help='Library file (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='List pieces with their size and tags')
+    add = commands.add_parser('add', help='Add a piece from a text file')
+    add.add_argument('name')
+    add.add_argument('file')
+    add.add_argument('-t', '--tags', nargs='+', default=[])
+    imp = commands.add_parser('import', help='Add every .txt file, named after the file')
+    imp.add_argument('inputs', nargs='+', help='Text files or directories of .txt files')
+    imp.add_argument('-t', '--tags', nargs='+', default=[])
+    exp = commands.add_parser('export', help='Write every piece to DIR/<name>.txt')
+    exp.add_argument('directory')
+    commands.add_parser('compact', help='Merge appended index segments')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'add':
+            append_pieces(args.library, [(args.name, _read_text(args.file), args.tags)])
+            print(f"Added '{args.name.lower()}' to {args.library}")
+        elif args.command == 'import':
+            paths = []
+            for item in args.inputs:
+                paths.extend(sorted(glob.glob(os.path.join(item, '*.txt'))) if os.path.isdir(item) else [item])
+            count = append_pieces(args.library, ((os.path.splitext(os.path.basename(path))[0],
+                                                  _read_text(path), args.tags) for path in paths))
+            print(f"Imported {count} pieces into {args.library}")
+        elif args.command == 'compact':
+            print(f"Compacted {args.library} to {compact(args.library)} pieces")
+        else:
+            with ArtLibrary(args.library) as lib:
+                if args.command == 'list':
+                    for name in lib:
+                        info = lib.info(name)
+                        print(f"{name:<24} {info.width:>4}x{info.height:<4} {', '.join(info.tags)}")
+                    print(f"\nTotal: {len(lib)} pieces in {lib.segments()} index segment(s)")
+                else:
+                    os.makedirs(args.directory, exist_ok=True)
+                    for name in lib:
+                        with open(os.path.join(args.directory, name + '.txt'), 'w', encoding='utf-8') as f:
+                            f.write(lib[name])
+                    print(f"Exported {len(lib)} pieces to {args.directory}")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
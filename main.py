@@ -1,15 +1,133 @@
+"""
+AsciiForge - GUI entry point
+
+    python main.py                        start the application
+    python main.py --startup-time         report time to first window and an
+                                          import breakdown on stderr
+    python main.py --startup-time=FILE    write the report to FILE instead
+    python main.py --startup-time --exit-after-startup
+                                          report and close, for tracking startup
+"""
+import sys
+import time
+
+_START = time.perf_counter()
+
 import tkinter as tk
-from gui import AsciiForgeApp
 
-def main():
+
+class _TimedLoader:
+    """Loader proxy that times ``exec_module`` for ImportTimer"""
+
+    def __init__(self, timer, name, loader):
+        self._timer = timer
+        self._name = name
+        self._loader = loader
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        timer = self._timer
+        timer.depth += 1
+        timer.child_time.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = timer.child_time.pop()
+            timer.depth -= 1
+            if timer.child_time:
+                timer.child_time[-1] += cumulative
+            timer.records.append((cumulative - children, cumulative, timer.depth, self._name))
+
+
+class ImportTimer:
+    """Meta path hook recording self and cumulative time of each import
+
+    The report uses the same layout as ``python -X importtime``, but also
+    works inside the frozen PyInstaller build where ``-X`` is unavailable.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.depth = 0
+        self.child_time = []
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(self, name, spec.loader)
+                return spec
+        return None
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def report(self):
+        lines = ["import time: self [us] | cumulative | imported package"]
+        for self_time, cumulative, depth, name in self.records:
+            lines.append(f"import time: {self_time * 1e6:9.0f} | {cumulative * 1e6:10.0f} | "
+                         f"{'  ' * depth}{name}")
+        return '\n'.join(lines)
+
+
+def _startup_option(argv):
+    """Return the --startup-time target: None (off), '' (stderr) or a filename"""
+    for arg in argv:
+        if arg == '--startup-time':
+            return ''
+        if arg.startswith('--startup-time='):
+            return arg.split('=', 1)[1]
+    return None
+
+
+def main(argv=None):
     """Main entry point"""
+    argv = sys.argv[1:] if argv is None else argv
+    report_to = _startup_option(argv)
+    timer = ImportTimer().install() if report_to is not None else None
+
+    from gui import AsciiForgeApp
+    imported = time.perf_counter()
     root = tk.Tk()
     app = AsciiForgeApp(root)
-    root.mainloop()
 
+    if timer is not None:
+        def first_window(event):
+            if event.widget is not root:
+                return
+            root.unbind('<Map>')
+            shown = time.perf_counter()
+            timer.uninstall()
+            report = (f"{timer.report()}\n"
+                      f"startup: imports {(imported - _START) * 1000:.1f} ms, "
+                      f"first window {(shown - _START) * 1000:.1f} ms\n")
+            if report_to:
+                with open(report_to, 'w', encoding='utf-8') as f:
+                    f.write(report)
+            elif sys.stderr is not None:  # windowed builds have no stderr
+                sys.stderr.write(report)
+            if '--exit-after-startup' in argv:
+                root.after_idle(root.destroy)
 
-if __name__ == "__main__":
-    main()
+        root.bind('<Map>', first_window)
 
+    root.mainloop()
 
 
+if __name__ == "__main__":
+    main()
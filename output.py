@@ -0,0 +1,240 @@
+"""
+Output module for AsciiForge - Writing large conversions without extra copies
+
+Converted art is usually built as one ``str``, which is then printed,
+encoded as a whole and written, so a wide conversion exists three or four
+times over. Here the glyphs of each row are mapped straight into one
+preallocated buffer with a fixed row stride (columns plus a line break),
+which is written out through a ``memoryview`` without being copied:
+
+    render_image(image, width)          rows in a RowBuffer (a bytearray)
+    save_image(image, path, width)      rows rendered straight into a
+                                        memory-mapped output file, or
+                                        streamed into a compressed sink
+
+Sinks are chosen by file name: '-' is stdout, and names ending in .gz,
+.bz2, .xz or .zst are compressed while streaming (.zst needs Python 3.14
+or the ``zstandard`` package). Art that is already text, or uses glyphs
+outside ASCII, is written with ``write_text`` or ``write_rows``, which
+encode one chunk or row at a time.
+"""
+import bz2
+import gzip
+import lzma
+import mmap
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import converter
+import files
+import instrument
+
+
+# Line break written after each row, as text-mode files would
+NEWLINE = os.linesep.encode('ascii')
+
+CHUNK_SIZE = 1 << 20   # bytes (or characters) handed to a sink at a time
+BAND_ROWS = 256        # character rows mapped at a time
+
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz', '.zst')
+
+
+def buffer_size(columns, rows, trailing_newline=False):
+    """Bytes taken by ``rows`` rows of ``columns`` single-byte glyphs"""
+    if columns <= 0 or rows <= 0:
+        return 0
+    return (columns + len(NEWLINE)) * rows - (0 if trailing_newline else len(NEWLINE))
+
+
+class RowBuffer:
+    """Rows of single-byte glyphs in one buffer, ``stride`` bytes apart
+
+    ``buffer`` may be any writable buffer of at least ``buffer_size`` bytes,
+    such as an mmap; by default a bytearray is allocated. The line breaks
+    are filled in up front.
+    """
+
+    def __init__(self, columns, rows, trailing_newline=False, buffer=None):
+        self.columns = columns
+        self.rows = rows
+        self.stride = columns + len(NEWLINE)
+        size = buffer_size(columns, rows, trailing_newline)
+        self.buffer = bytearray(size) if buffer is None else buffer
+        self.view = memoryview(self.buffer)[:size]
+        for k, byte in enumerate(NEWLINE):
+            breaks = range(columns + k, size, self.stride)
+            self.view[columns + k:size:self.stride] = bytes((byte,)) * len(breaks)
+
+    def __len__(self):
+        return len(self.view)
+
+    def set_rows(self, y, glyphs):
+        """Copy whole rows of glyph bytes (a multiple of ``columns`` long) in from row ``y``"""
+        glyphs = memoryview(glyphs)
+        view, columns = self.view, self.columns
+        offset = y * self.stride
+        for start in range(0, len(glyphs), columns):
+            view[offset:offset + columns] = glyphs[start:start + columns]
+            offset += self.stride
+
+    def release(self):
+        """Drop the view, e.g. before closing an mmap buffer"""
+        self.view.release()
+
+
+def ascii_table(chars=converter.ASCII_CHARS):
+    """The glyph table for ``chars`` if every glyph is one ASCII byte, else None"""
+    table = converter.glyph_table(tuple(chars))
+    return table if isinstance(table, bytes) and table.isascii() else None
+
+
+def render_image(image, width=100, chars=converter.ASCII_CHARS, dither=None, trailing_newline=False,
+                 buffer=None):
+    """Convert a PIL image into a RowBuffer, as ``converter.image_to_ascii`` would
+
+    ``chars`` must all be ASCII (see ``ascii_table``). Without dithering
+    the glyphs are mapped BAND_ROWS rows at a time, so no full-size string
+    is ever built.
+    """
+    table = ascii_table(chars)
+    if table is None:
+        raise ValueError("Only ASCII characters can be rendered into a row buffer; use write_text")
+    columns, rows = converter.target_size(image.size, width)
+    if columns <= 0 or rows <= 0:
+        return RowBuffer(0, 0, buffer=buffer)
+    small = converter.resize_image(image, width)
+    if small.mode != 'L':
+        small = converter.grayscale(small)
+    out = RowBuffer(columns, rows, trailing_newline, buffer)
+    try:
+        with instrument.span('glyph_mapping') as span:
+            span.count(pixels=columns * rows)
+            if dither is not None:
+                out.set_rows(0, converter.pixels_to_ascii(small, chars, dither).encode('ascii'))
+            else:
+                for y in range(0, rows, BAND_ROWS):
+                    band = small.crop((0, y, columns, min(rows, y + BAND_ROWS)))
+                    out.set_rows(y, band.tobytes().translate(table))
+    except BaseException:
+        # A live view would keep a caller's mmap from closing
+        out.release()
+        raise
+    return out
+
+
+def _zstd_open(path):
+    try:
+        from compression import zstd  # Python 3.14
+        return zstd.open(path, 'wb')
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("Writing .zst files needs Python 3.14 or the zstandard package "
+                         "(pip install zstandard)") from None
+    return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+
+
+@contextmanager
+def open_sink(path):
+    """Open a binary sink for ``path``: '-' for stdout, compressed by suffix, else a plain file"""
+    if path == '-':
+        sys.stdout.flush()
+        yield sys.stdout.buffer
+        sys.stdout.buffer.flush()
+        return
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == '.gz':
+        sink = gzip.open(path, 'wb')
+    elif suffix == '.bz2':
+        sink = bz2.open(path, 'wb')
+    elif suffix == '.xz':
+        sink = lzma.open(path, 'wb')
+    elif suffix == '.zst':
+        sink = _zstd_open(path)
+    else:
+        sink = open(path, 'wb')
+    with sink:
+        yield sink
+
+
+def write_buffer(data, sink):
+    """Write a buffer to a sink in CHUNK_SIZE slices of one memoryview"""
+    view = memoryview(data)
+    for start in range(0, len(view), CHUNK_SIZE):
+        sink.write(view[start:start + CHUNK_SIZE])
+    return len(view)
+
+
+def write_text(path, text):
+    """Write text to ``path`` as UTF-8, encoding CHUNK_SIZE characters at a time"""
+    written = 0
+    with open_sink(path) as sink:
+        for start in range(0, len(text), CHUNK_SIZE):
+            chunk = text[start:start + CHUNK_SIZE]
+            if NEWLINE != b'\n':
+                chunk = chunk.replace('\n', os.linesep)
+            data = chunk.encode('utf-8')
+            sink.write(data)
+            written += len(data)
+    return written
+
+
+def write_rows(path, rows):
+    """Write an iterable of row strings to ``path``, one line each (no final line break)"""
+    written = 0
+    with open_sink(path) as sink:
+        for index, row in enumerate(rows):
+            data = (NEWLINE if index else b'') + row.encode('utf-8')
+            sink.write(data)
+            written += len(data)
+    return written
+
+
+def save_image(image, path, width=100, chars=converter.ASCII_CHARS, dither=None):
+    """Convert a PIL image and write it to ``path`` (see ``open_sink``); returns the bytes written
+
+    Plain files are rendered into a memory-mapped temporary file next to
+    ``path``, which replaces ``path`` once complete, so a failed conversion
+    leaves an existing file untouched. Other sinks get the RowBuffer
+    streamed into them. Characters outside ASCII go through ``write_text``.
+    """
+    with instrument.span('write') as span:
+        if ascii_table(chars) is None:
+            written = write_text(path, converter.image_to_ascii(image, width, chars, dither))
+        elif path == '-' or os.path.splitext(path)[1].lower() in COMPRESSED_SUFFIXES:
+            rendered = render_image(image, width, chars, dither)
+            with open_sink(path) as sink:
+                written = write_buffer(rendered.view, sink)
+        else:
+            written = buffer_size(*converter.target_size(image.size, width))
+            fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(os.path.abspath(path)))
+            try:
+                with os.fdopen(fd, 'w+b') as f:
+                    f.truncate(written)
+                    if written:
+                        with mmap.mmap(f.fileno(), written) as mapped:
+                            rendered = render_image(image, width, chars, dither, buffer=mapped)
+                            try:
+                                mapped.flush()
+                            finally:
+                                rendered.release()
+                os.chmod(tmp, files.file_mode(path))
+                os.replace(tmp, path)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+        span.count(bytes=written)
+        return written
+
+
+def save_file(image_path, path, width=100, chars=converter.ASCII_CHARS, dither=None):
+    """Open an image file, convert it and write the art to ``path``"""
+    with converter.open_image(image_path) as image:
+        return save_image(image, path, width, chars, dither)
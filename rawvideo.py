@@ -0,0 +1,204 @@
+"""
+Rawvideo module for AsciiForge - Live ASCII from a stream of raw video frames
+
+Reads fixed-size uncompressed frames from stdin or a FIFO, for example as
+decoded by ffmpeg:
+
+    ffmpeg -i clip.mp4 -f rawvideo -pix_fmt gray - | python ascii_art_tester.py --raw 1920x1080
+
+Every frame is read with ``readinto`` into one buffer allocated up front.
+For ``gray`` and ``rgb0`` a Pillow image is wrapped around that buffer
+once, so a new frame is just new bytes under the same image; ``rgb24``
+frames are unpacked into one reused image. Each frame is then reduced to
+the character grid (``reducing_gap`` lets Pillow box-reduce by an integer
+factor before the final resample) and mapped through the glyph table.
+
+Pillow cannot resize into an existing image, so the reduced grid and its
+glyph bytes are still allocated per frame; they are grid-sized, not
+frame-sized. When the output is not a terminal, the glyphs are copied into
+one reused ``output.RowBuffer`` and written from it, instead of being
+joined into a new string per frame.
+
+Frames go to the diff renderer when the output is a terminal, otherwise to
+the output one after another, each followed by a form feed line. With a
+frame rate the stream is paced like ``--animate``: frames that are already
+late are read but not converted (skipped), and converted frames that took
+longer than one frame interval are counted as overruns.
+"""
+import os
+import sys
+import time
+from PIL import Image
+
+import converter
+import instrument
+import output
+import terminal
+
+
+# ffmpeg pixel format: (Pillow mode, bytes per pixel)
+PIXEL_FORMATS = {
+    'gray': ('L', 1),
+    'rgb24': ('RGB', 3),
+    'rgb0': ('RGBX', 4),
+}
+
+# Modes Pillow can wrap around a buffer without copying it
+SHARED_MODES = ('L', 'RGBX')
+
+REDUCING_GAP = 2.0
+
+# Written after each frame when the output is not a terminal
+FRAME_SEPARATOR = '\f\n'
+
+
+def parse_size(text):
+    """Parse a 'WIDTHxHEIGHT' frame size"""
+    try:
+        width, height = (int(part) for part in text.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Frame size must look like 1920x1080, got {text!r}") from None
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Frame size must be positive, got {text!r}")
+    return width, height
+
+
+class RawFrameReader:
+    """Read fixed-size raw frames from a binary stream into one reused image"""
+
+    def __init__(self, stream, size, pix_fmt='gray'):
+        if pix_fmt not in PIXEL_FORMATS:
+            raise ValueError(f"Unknown pixel format: {pix_fmt} (choose from {', '.join(PIXEL_FORMATS)})")
+        mode, depth = PIXEL_FORMATS[pix_fmt]
+        self.stream = stream
+        self.size = size
+        self.buffer = bytearray(size[0] * size[1] * depth)
+        self._view = memoryview(self.buffer)
+        self._shared = mode in SHARED_MODES
+        if self._shared:
+            self.image = Image.frombuffer(mode, size, self.buffer, 'raw', mode, 0, 1)
+        else:
+            self.image = Image.new(mode, size)
+
+    def read(self):
+        """Read the next frame into ``image``; returns False at the end of the stream
+
+        A truncated last frame is discarded.
+        """
+        view = self._view
+        filled = 0
+        while filled < len(view):
+            count = self.stream.readinto(view[filled:] if filled else view)
+            if not count:
+                return False
+            filled += count
+        if not self._shared:
+            self.image.frombytes(self.buffer)
+        return True
+
+
+class StreamStats:
+    """Frame counters of a raw stream"""
+
+    def __init__(self):
+        self.frames = 0      # read from the stream
+        self.converted = 0
+        self.skipped = 0     # late, read but not converted
+        self.overruns = 0    # converted, but slower than the frame interval
+        self.busy = 0.0      # s spent converting and writing
+
+    def as_dict(self):
+        return {'frames': self.frames, 'converted': self.converted, 'skipped': self.skipped,
+                'overruns': self.overruns,
+                'ms_per_frame': round(self.busy * 1000 / self.converted, 3) if self.converted else None}
+
+
+def reduce_frame(image, size):
+    """Reduce a frame to the ``size`` character grid as a grayscale image"""
+    with instrument.span('raw_frame') as span:
+        span.count(pixels=image.width * image.height)
+        small = image.resize(size, reducing_gap=REDUCING_GAP)
+        return small if small.mode == 'L' else small.convert('L')
+
+
+def frame_glyphs(image, size, chars=converter.ASCII_CHARS):
+    """Reduce a frame to the ``size`` character grid and map it, as a flat string"""
+    return converter.map_pixels(reduce_frame(image, size).tobytes(), chars)
+
+
+class FrameWriter:
+    """Write frames one after another to an output that is not a terminal
+
+    With ASCII glyphs and an output that has a binary ``buffer``, every
+    frame is translated into the same RowBuffer and written from it;
+    otherwise its rows are joined as text.
+    """
+
+    def __init__(self, out, columns, rows, chars=converter.ASCII_CHARS):
+        self.out = out
+        self.columns = columns
+        self.chars = chars
+        self.table = output.ascii_table(chars) if hasattr(out, 'buffer') else None
+        if self.table is not None:
+            self.rows = output.RowBuffer(columns, rows, trailing_newline=True)
+            self.separator = FRAME_SEPARATOR.replace('\n', os.linesep).encode('ascii')
+
+    def write(self, small):
+        """Write one reduced frame (see ``reduce_frame``) and the frame separator"""
+        if self.table is None:
+            glyphs = converter.map_pixels(small.tobytes(), self.chars)
+            self.out.write(converter.join_rows(glyphs, self.columns, trailing_newline=True))
+            self.out.write(FRAME_SEPARATOR)
+            self.out.flush()
+            return
+        self.rows.set_rows(0, small.tobytes().translate(self.table))
+        self.out.flush()
+        self.out.buffer.write(self.rows.view)
+        self.out.buffer.write(self.separator)
+        self.out.buffer.flush()
+
+
+def play(stream, size, width=100, pix_fmt='gray', fps=None, out=None, diff=None,
+         chars=converter.ASCII_CHARS):
+    """Convert raw frames of ``size`` pixels from ``stream`` until it ends
+
+    ``diff`` selects the diff renderer; by default it is used when ``out``
+    is a terminal. Ctrl-C ends the stream early. Returns the StreamStats
+    either way.
+    """
+    out = out or sys.stdout
+    reader = RawFrameReader(stream, size, pix_fmt)
+    columns, rows = converter.target_size(size, width)
+    if columns <= 0 or rows <= 0:
+        raise ValueError(f"A {size[0]}x{size[1]} frame is too small for {width} columns")
+    if diff is None:
+        diff = out.isatty()
+    pacer = terminal.FramePacer(fps) if fps else None
+    stats = StreamStats()
+    screen = terminal.TerminalRenderer(out) if diff else None
+    writer = None if diff else FrameWriter(out, columns, rows, chars)
+    if screen:
+        screen.start()
+    try:
+        while reader.read():
+            stats.frames += 1
+            if pacer and not pacer.tick():
+                stats.skipped += 1
+                continue
+            start = time.perf_counter()
+            if screen:
+                glyphs = frame_glyphs(reader.image, (columns, rows), chars)
+                screen.render([glyphs[i:i + columns] for i in range(0, len(glyphs), columns)])
+            else:
+                writer.write(reduce_frame(reader.image, (columns, rows)))
+            elapsed = time.perf_counter() - start
+            stats.converted += 1
+            stats.busy += elapsed
+            if pacer and elapsed > pacer.interval:
+                stats.overruns += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if screen:
+            screen.stop()
+    return stats
@@ -0,0 +1,494 @@
+"""
+Search module for AsciiForge - Indexed search over the art library
+
+Queries are whitespace-separated terms:
+
+    cat                 name or tag: exact, prefix, word prefix, substring
+                        and (for 4+ letters) fuzzy matches, best first
+    tag:animal          only pieces with this tag
+    w<=40  h>10         width/height filters (<, <=, >, >=, =)
+    text:/\\  "(o.o)"    only pieces whose art contains this text
+
+Every term must match. Names, name words and tags use sorted keys (prefix
+ranges by bisect), names are joined into one string for substring scans,
+and fuzzy candidates come from trigram postings over the name vocabulary. Art text uses hashed trigram signatures stored bit-sliced: one
+big integer per signature bit with a bit per piece, so a text query ANDs a
+few integers to get its candidates before checking the text itself.
+
+Building the index for a large library takes a while, so indexes of large
+libraries are saved in the conversion cache directory and reused until the
+library file changes. The GUI builds or loads it on a background thread.
+"""
+import bisect
+import heapq
+import os
+import pickle
+import re
+import tempfile
+import threading
+from array import array
+from collections import namedtuple
+from itertools import compress
+
+
+INDEX_VERSION = 1
+SIGNATURE_BITS = 1024
+# Libraries at least this large have their index saved to disk
+PERSIST_MIN_PIECES = 5000
+DEFAULT_LIMIT = 20
+# Queries whose narrowest width/height filter leaves at most this many
+# pieces are answered by scoring those pieces directly
+FILTER_SCAN_MAX = 5000
+# Vocabulary words summed when estimating how selective a term is
+ESTIMATE_WORDS = 256
+
+# Scores of the ways a term can match; a piece scores its best match per term
+SCORE_EXACT = 1000
+SCORE_PREFIX = 500
+SCORE_WORD_PREFIX = 300
+SCORE_TAG = 250
+SCORE_TAG_PREFIX = 150
+SCORE_SUBSTRING = 100
+SCORE_FUZZY = 50
+
+SearchResult = namedtuple('SearchResult', ['name', 'score', 'width', 'height', 'tags'])
+
+_FILTER = re.compile(r'^(w|width|h|height)(<=|>=|<|>|=)(\d+)$')
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r'[^a-z0-9]+')
+_COMPARE = {
+    '<': lambda value, limit: value < limit,
+    '<=': lambda value, limit: value <= limit,
+    '>': lambda value, limit: value > limit,
+    '>=': lambda value, limit: value >= limit,
+    '=': lambda value, limit: value == limit,
+}
+
+
+def _name_trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _signature_bits(data):
+    """Signature bit positions of the byte trigrams in ``data``"""
+    trigrams = {data[i:i + 3] for i in range(len(data) - 2)}
+    return {((int.from_bytes(t, 'little') * 0x9E3779B1) & 0xFFFFFFFF) >> 22 for t in trigrams}
+
+
+def _bit_ids(bits):
+    """Indices of the set bits of a bitset, in ascending order"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for index in compress(range(len(data)), data):
+        byte = data[index]
+        base = index * 8
+        for bit in range(8):
+            if byte >> bit & 1:
+                yield base + bit
+
+
+def _within_distance(a, b, limit):
+    """Whether ``a`` and ``b`` are at most ``limit`` edits apart
+
+    Edits are insertions, deletions, substitutions and swaps of adjacent
+    characters (optimal string alignment distance).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return False
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= limit
+
+
+def _rank(result):
+    score, piece_id = result
+    return score, -piece_id
+
+
+def _fuzzy_distance(term):
+    return 1 if len(term) < 8 else 2
+
+
+class SearchIndex:
+    """Prebuilt search index over an art library (any name -> text mapping)"""
+
+    def __init__(self, library):
+        self.library = library
+        self.names = []
+        self.words = []
+        self.widths = array('I')
+        self.heights = array('I')
+        self.tags = []
+        self.stamp = None
+
+    @classmethod
+    def build(cls, library):
+        """Index every piece of ``library``; ArtLibrary supplies sizes and tags"""
+        index = cls(library)
+        index.stamp = _stamp(library)
+        info = getattr(library, 'info', None)
+        vocabulary, tag_ids = {}, {}
+        slices = [bytearray() for _ in range(SIGNATURE_BITS)]
+        for piece_id, name in enumerate(library):
+            text = library[name]
+            if info:
+                piece = info(name)
+                width, height, tags = piece.width, piece.height, piece.tags
+            else:
+                lines = text.strip('\n').split('\n')
+                width, height, tags = max(map(len, lines)), len(lines), ()
+            words = tuple(word for word in _WORD.split(name) if word)
+            index.names.append(name)
+            index.words.append(words)
+            index.widths.append(width)
+            index.heights.append(height)
+            index.tags.append(tags)
+            for word in set(words):
+                vocabulary.setdefault(word, array('I')).append(piece_id)
+            for tag in tags:
+                tag_ids.setdefault(tag, array('I')).append(piece_id)
+
+            byte, mask = piece_id >> 3, 1 << (piece_id & 7)
+            for bit in _signature_bits(text.encode('utf-8')):
+                row = slices[bit]
+                if len(row) <= byte:
+                    row.extend(bytes(byte + 1 - len(row)))
+                row[byte] |= mask
+
+        order = sorted(range(len(index.names)), key=index.names.__getitem__)
+        index._name_keys = [index.names[i] for i in order]
+        index._name_ids = array('I', order)
+        index._lookup = {name: piece_id for piece_id, name in enumerate(index.names)}
+        index._name_blob = '\n' + '\n'.join(index.names) + '\n'
+        starts, position = array('I'), 1
+        for name in index.names:
+            starts.append(position)
+            position += len(name) + 1
+        index._name_starts = starts
+        index._vocabulary = vocabulary
+        index._vocabulary_keys = sorted(vocabulary)
+        word_trigrams = {}
+        for word in index._vocabulary_keys:
+            for trigram in _name_trigrams(word):
+                word_trigrams.setdefault(trigram, []).append(word)
+        index._word_trigrams = word_trigrams
+        index._tag_ids = tag_ids
+        index._tag_keys = sorted(tag_ids)
+        for field, values in (('width', index.widths), ('height', index.heights)):
+            order = sorted(range(len(values)), key=values.__getitem__)
+            setattr(index, f"_by_{field}", array('I', order))
+            setattr(index, f"_sorted_{field}", array('I', [values[i] for i in order]))
+        index._text_bits = [int.from_bytes(row, 'little') for row in slices]
+        return index
+
+    def __len__(self):
+        return len(self.names)
+
+    def _range(self, keys, prefix):
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\uffff', start)
+        return start, end
+
+    def _fuzzy_words(self, term):
+        """Vocabulary words within a small edit distance of ``term``"""
+        distance = _fuzzy_distance(term)
+        # An edit changes at most four trigrams (a swap touches four), so a
+        # word within ``distance`` edits shares at least one of any
+        # 4 * distance + 1 of the term's trigrams; use the rarest ones.
+        postings = sorted((self._word_trigrams.get(t, ()) for t in _name_trigrams(term)), key=len)
+        candidates = set()
+        for posting in postings[:4 * distance + 1]:
+            candidates.update(posting)
+        return [word for word in candidates if word != term and _within_distance(term, word, distance)]
+
+    def _candidates(self, term):
+        """Yield (piece id, score) for pieces matching ``term``, best tiers first"""
+        piece_id = self._lookup.get(term)
+        if piece_id is not None:
+            yield piece_id, SCORE_EXACT
+        start, end = self._range(self._name_keys, term)
+        for i in range(start, end):
+            yield self._name_ids[i], SCORE_PREFIX
+        start, end = self._range(self._vocabulary_keys, term)
+        for word in self._vocabulary_keys[start:end]:
+            for piece_id in self._vocabulary[word]:
+                yield piece_id, SCORE_WORD_PREFIX
+        for piece_id in self._tag_ids.get(term, ()):
+            yield piece_id, SCORE_TAG
+        start, end = self._range(self._tag_keys, term)
+        for tag in self._tag_keys[start:end]:
+            for piece_id in self._tag_ids[tag]:
+                yield piece_id, SCORE_TAG_PREFIX
+        position = self._name_blob.find(term)
+        while position != -1:
+            piece_id = bisect.bisect_right(self._name_starts, position) - 1
+            yield piece_id, SCORE_SUBSTRING
+            position = self._name_blob.find(term, self._name_starts[piece_id] + len(self.names[piece_id]))
+        if len(term) >= 4:
+            for word in self._fuzzy_words(term):
+                for piece_id in self._vocabulary[word]:
+                    yield piece_id, SCORE_FUZZY
+
+    def _estimate(self, term):
+        """Rough number of pieces ``term`` matches by name, word or tag prefix"""
+        start, end = self._range(self._name_keys, term)
+        count = end - start
+        start, end = self._range(self._vocabulary_keys, term)
+        for word in self._vocabulary_keys[start:min(end, start + ESTIMATE_WORDS)]:
+            count += len(self._vocabulary[word])
+        if end - start > ESTIMATE_WORDS:
+            count += len(self.names)
+        start, end = self._range(self._tag_keys, term)
+        for tag in self._tag_keys[start:end]:
+            count += len(self._tag_ids[tag])
+        return count
+
+    def _scorer(self, term):
+        """Return a function scoring ``term`` against a piece id (0: no match)"""
+        fuzzy = set(self._fuzzy_words(term)) if len(term) >= 4 else ()
+
+        def score(piece_id):
+            name = self.names[piece_id]
+            if term in name:
+                if name == term:
+                    return SCORE_EXACT
+                if name.startswith(term):
+                    return SCORE_PREFIX
+                for word in self.words[piece_id]:
+                    if word.startswith(term):
+                        return SCORE_WORD_PREFIX
+            tags = self.tags[piece_id]
+            if term in tags:
+                return SCORE_TAG
+            for tag in tags:
+                if tag.startswith(term):
+                    return SCORE_TAG_PREFIX
+            if term in name:
+                return SCORE_SUBSTRING
+            if fuzzy:
+                for word in self.words[piece_id]:
+                    if word in fuzzy:
+                        return SCORE_FUZZY
+            return 0
+        return score
+
+    def _filter_range(self, field, op, value):
+        """Piece ids satisfying one width/height filter, as a slice of a sorted order"""
+        keys = getattr(self, f"_sorted_{field}")
+        low, high = 0, len(keys)
+        if op in ('<', '<='):
+            high = (bisect.bisect_left if op == '<' else bisect.bisect_right)(keys, value)
+        elif op in ('>', '>='):
+            low = (bisect.bisect_right if op == '>' else bisect.bisect_left)(keys, value)
+        else:
+            low, high = bisect.bisect_left(keys, value), bisect.bisect_right(keys, value)
+        return getattr(self, f"_by_{field}")[low:high]
+
+    def _text_candidates(self, needle):
+        """Return (piece ids that may contain ``needle``, their count)"""
+        data = needle.encode('utf-8')
+        if len(data) < 3:
+            return range(len(self.names)), len(self.names)
+        bits = -1
+        for bit in _signature_bits(data):
+            bits &= self._text_bits[bit]
+        if bits <= 0:
+            return (), 0
+        return _bit_ids(bits), bin(bits).count('1')
+
+    def _parse(self, query):
+        words, texts, tags, filters = [], [], [], []
+        for quoted, token in _TERM.findall(query):
+            if quoted or token.startswith('text:'):
+                needle = quoted if quoted else token[5:]
+                if needle:
+                    texts.append(needle)
+                continue
+            token = token.lower()
+            match = _FILTER.match(token)
+            if match:
+                field, op, value = match.groups()
+                filters.append(('width' if field.startswith('w') else 'height', op, int(value)))
+            elif token.startswith('tag:'):
+                if token[4:]:
+                    tags.append(token[4:])
+            else:
+                words.append(token)
+        return words, texts, tags, filters
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Return up to ``limit`` SearchResults for ``query``, best first"""
+        words, texts, tags, filters = self._parse(query)
+
+        checks = []
+        if tags:
+            checks.append(lambda piece_id: all(tag in self.tags[piece_id] for tag in tags))
+        for field, op, value in filters:
+            values, compare = getattr(self, field + 's'), _COMPARE[op]
+            checks.append(lambda piece_id, values=values, compare=compare, value=value:
+                          compare(values[piece_id], value))
+        if texts:
+            checks.append(lambda piece_id: all(needle in self.library[self.names[piece_id]]
+                                               for needle in texts))
+
+        def accept(piece_id):
+            return all(check(piece_id) for check in checks)
+
+        ranges = [self._filter_range(*f) for f in filters]
+        narrowest = min(ranges, key=len) if ranges else None
+
+        if not words:
+            if texts:
+                # Text candidates are verified by accept(); a narrower filter may drive instead
+                candidates, count = self._text_candidates(texts[0])
+                if narrowest is not None and len(narrowest) < count:
+                    candidates = narrowest
+            elif tags:
+                candidates = self._tag_ids.get(tags[0], ())
+            elif narrowest is not None:
+                # Ordered by the filtered dimension
+                candidates = narrowest
+            else:
+                candidates = range(len(self.names))
+            results = []
+            for piece_id in candidates:
+                if accept(piece_id):
+                    results.append((0, piece_id))
+                    if len(results) >= limit:
+                        break
+        elif narrowest is not None and len(narrowest) <= FILTER_SCAN_MAX:
+            # A selective width/height filter: score just the pieces inside it
+            scorers = [self._scorer(word) for word in words]
+            scored = []
+            for piece_id in narrowest:
+                total = 0
+                for scorer in scorers:
+                    score = scorer(piece_id)
+                    if not score:
+                        break
+                    total += score
+                else:
+                    if accept(piece_id):
+                        scored.append((total, piece_id))
+            results = heapq.nlargest(limit, scored, key=_rank)
+        elif len(words) == 1:
+            # Candidates arrive in score order, so stop once the limit is met
+            results, seen = [], set()
+            for piece_id, score in self._candidates(words[0]):
+                if piece_id not in seen:
+                    seen.add(piece_id)
+                    if accept(piece_id):
+                        results.append((score, piece_id))
+                        if len(results) >= limit:
+                            break
+        else:
+            # Every word must match: walk the most selective word's matches
+            # and score the other words against each of them
+            driver = min(words, key=self._estimate)
+            scorers = [self._scorer(word) for word in words if word is not driver]
+            scored, seen = [], set()
+            for piece_id, total in self._candidates(driver):
+                if piece_id in seen:
+                    continue
+                seen.add(piece_id)
+                for scorer in scorers:
+                    score = scorer(piece_id)
+                    if not score:
+                        break
+                    total += score
+                else:
+                    if accept(piece_id):
+                        scored.append((total, piece_id))
+            results = heapq.nlargest(limit, scored, key=_rank)
+
+        return [SearchResult(self.names[piece_id], score, self.widths[piece_id], self.heights[piece_id],
+                             self.tags[piece_id]) for score, piece_id in results]
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['library']
+        return state
+
+
+def _stamp(library):
+    """Identify the state of a library file, or None for in-memory mappings"""
+    path = getattr(library, 'path', None)
+    if not path:
+        return None
+    st = os.stat(path)
+    return INDEX_VERSION, os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+def _index_path(stamp):
+    import hashlib
+    import cache
+    digest = hashlib.blake2b(stamp[1].encode('utf-8'), digest_size=10).hexdigest()
+    return os.path.join(cache.default_cache_dir(), f"search-{digest}.idx")
+
+
+def load_index(library):
+    """Return a SearchIndex for ``library``, reusing a saved one if current"""
+    stamp = _stamp(library)
+    path = _index_path(stamp) if stamp and len(library) >= PERSIST_MIN_PIECES else None
+    if path:
+        try:
+            with open(path, 'rb') as f:
+                if pickle.load(f) == stamp:
+                    index = pickle.load(f)
+                    index.library = library
+                    return index
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+            pass
+    index = SearchIndex.build(library)
+    if path:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(stamp, f, pickle.HIGHEST_PROTOCOL)
+                    pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+        except OSError:
+            pass  # an unwritable cache only costs a rebuild next time
+    return index
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def default_index():
+    """Return the index of the default art library, rebuilding it after changes
+
+    Safe to call from a background thread; concurrent callers wait for a
+    single build.
+    """
+    global _default_index
+    import example
+    with _default_lock:
+        library = example.get_library()
+        if (_default_index is None or _default_index.library is not library
+                or _default_index.stamp != _stamp(library)):
+            _default_index = load_index(library)
+        return _default_index
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    """Search the default art library"""
+    return default_index().search(query, limit)
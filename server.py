@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Server module for AsciiForge - Persistent conversion daemon
+
+    python server.py --socket /tmp/asciiforge.sock
+    python server.py --port 8765          (localhost TCP, e.g. on Windows)
+    python server.py --stdio
+
+Requests and responses are JSON objects, one per line:
+
+    {"id": 1, "path": "photo.jpg", "width": 100, "mode": "ascii"}
+    {"id": 2, "data": "<base64 image bytes>", "width": 80, "mode": "braille"}
+    {"id": 3, "op": "stats"}
+    -> {"id": 1, "ascii": "..."}   or   {"id": 2, "error": "..."}
+
+``mode`` is one of MODES; ``dither``, ``threshold`` and ``invert`` are
+passed on to the modes that take them. Relative paths are resolved against
+the server's working directory.
+
+Conversions run in a process pool that is started once and kept warm, so a
+request costs a decode and a conversion rather than an interpreter start
+and the PIL import. Responses are sent as they complete and may arrive out
+of order; match them up by ``id``. A connection may have at most
+``max_inflight`` requests outstanding: past that the server stops reading
+from it until results have been sent. The pool never has more than
+``max_queue`` jobs waiting, so a flood of requests cannot grow memory.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+import cache
+import converter
+import instrument
+
+
+MODES = ('ascii', 'shape', 'braille', 'halfblock', 'ansi', 'ansi256', 'html')
+
+# Longest accepted request line, base64 image data included
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+MAX_INFLIGHT = 64   # outstanding requests per connection
+QUEUE_PER_JOB = 4   # pool jobs waiting per worker process
+# Pool workers exit without running atexit handlers, so they persist their
+# cache counters at most this often instead
+STATS_FLUSH_INTERVAL = 1.0  # s
+
+_use_cache = True
+_last_flush = 0.0
+
+
+def _warm_worker(use_cache):
+    """Pool initializer: import every conversion module once per worker"""
+    global _use_cache
+    _use_cache = use_cache
+    import color     # noqa: F401
+    import glyphs    # noqa: F401
+    import subpixel  # noqa: F401
+
+
+def _open_request_image(request):
+    if 'data' in request:
+        with instrument.span('open') as span:
+            data = base64.b64decode(request['data'])
+            image = Image.open(io.BytesIO(data))
+            image.load()
+            span.count(bytes=len(data), pixels=image.width * image.height)
+            return image
+    return converter.open_image(request['path'])
+
+
+def convert_request(request):
+    """Run one validated conversion request and return the art"""
+    mode = request.get('mode', 'ascii')
+    width = request.get('width', 100)
+    dither = request.get('dither')
+    if mode == 'ascii' and 'path' in request and _use_cache:
+        global _last_flush
+        try:
+            return cache.convert_file(request['path'], width, dither=dither)
+        finally:
+            if time.monotonic() - _last_flush >= STATS_FLUSH_INTERVAL:
+                _last_flush = time.monotonic()
+                cache.default_cache().flush_stats()
+    with _open_request_image(request) as image:
+        if mode == 'ascii':
+            return converter.image_to_ascii(image, width, dither=dither)
+        if mode == 'shape':
+            import glyphs
+            return glyphs.image_to_glyphs(image, width, invert=request.get('invert', False))
+        if mode in ('braille', 'halfblock'):
+            import subpixel
+            return subpixel.image_to_subpixels(image, width, mode,
+                                               request.get('threshold', subpixel.DEFAULT_THRESHOLD),
+                                               request.get('invert', False), dither)
+        import color
+        return color.image_to_color(image, width, mode, dither=dither)
+
+
+def check_request(request):
+    """Return an error message for a malformed request, or None"""
+    if not isinstance(request, dict):
+        return "Request must be a JSON object"
+    if request.get('mode', 'ascii') not in MODES:
+        return f"Unknown mode: {request.get('mode')} (choose from {', '.join(MODES)})"
+    width = request.get('width', 100)
+    if not isinstance(width, int) or isinstance(width, bool) or not 0 < width <= 10000:
+        return "width must be an integer between 1 and 10000"
+    if ('path' in request) == ('data' in request):
+        return "Give exactly one of 'path' or 'data'"
+    return None
+
+
+class ConversionServer:
+    """Serve JSON-lines conversion requests from a warm process pool"""
+
+    def __init__(self, jobs=None, max_inflight=MAX_INFLIGHT, max_queue=None, use_cache=True):
+        self.jobs = jobs if jobs is not None else os.cpu_count() or 1
+        if self.jobs < 1 or max_inflight < 1 or (max_queue is not None and max_queue < 1):
+            raise ValueError("jobs, max_inflight and max_queue must be at least 1")
+        self.max_inflight = max_inflight
+        self.use_cache = use_cache
+        self.pool = self._new_pool()
+        self._queue_slots = None  # created on the event loop
+        self.max_queue = max_queue if max_queue is not None else self.jobs * QUEUE_PER_JOB
+        self.requests = 0
+        self.errors = 0
+        self.active = 0
+        self.restarts = 0
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.jobs, initializer=_warm_worker, initargs=(self.use_cache,))
+
+    def _restart_pool(self, broken):
+        """Replace a pool left unusable by a crashed worker, once for all the requests it failed"""
+        if self.pool is broken:
+            broken.shutdown(wait=False)
+            self.pool = self._new_pool()
+            self.restarts += 1
+
+    def stats(self):
+        return {'requests': self.requests, 'errors': self.errors, 'active': self.active,
+                'jobs': self.jobs, 'max_queue': self.max_queue, 'restarts': self.restarts}
+
+    async def handle(self, request):
+        """Answer one request object"""
+        self.requests += 1
+        reply = {'id': request.get('id')} if isinstance(request, dict) else {'id': None}
+        if isinstance(request, dict) and request.get('op') == 'stats':
+            reply['stats'] = self.stats()
+            return reply
+        error = check_request(request)
+        if error is None:
+            if self._queue_slots is None:
+                self._queue_slots = asyncio.Semaphore(self.max_queue)
+            async with self._queue_slots:
+                self.active += 1
+                pool = self.pool
+                try:
+                    loop = asyncio.get_running_loop()
+                    reply['ascii'] = await loop.run_in_executor(pool, convert_request, request)
+                except BrokenProcessPool as e:
+                    error = f"{type(e).__name__}: {e}"
+                    self._restart_pool(pool)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                finally:
+                    self.active -= 1
+        if error is not None:
+            self.errors += 1
+            reply['error'] = error
+        return reply
+
+    async def serve_lines(self, readline, send):
+        """Answer request lines from ``readline`` until EOF, sending each reply line"""
+        inflight = asyncio.Semaphore(self.max_inflight)
+        tasks = set()
+
+        async def answer(line):
+            try:
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    self.requests += 1
+                    self.errors += 1
+                    reply = {'id': None, 'error': f"Invalid JSON: {e}"}
+                else:
+                    reply = await self.handle(request)
+                await send((json.dumps(reply) + '\n').encode('utf-8'))
+            finally:
+                inflight.release()
+
+        try:
+            while True:
+                await inflight.acquire()
+                try:
+                    line = await readline()
+                except ValueError:  # longer than the stream limit
+                    inflight.release()
+                    await send((json.dumps({'id': None, 'error': "Request too large"}) + '\n').encode('utf-8'))
+                    break
+                if not line:
+                    inflight.release()
+                    break
+                if not line.strip():
+                    inflight.release()
+                    continue
+                task = asyncio.ensure_future(answer(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _client(self, reader, writer):
+        lock = asyncio.Lock()
+
+        async def send(data):
+            async with lock:
+                writer.write(data)
+                await writer.drain()
+
+        try:
+            await self.serve_lines(reader.readline, send)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_socket(self, path=None, port=None):
+        """Listen on a Unix domain socket, or on localhost ``port``, until cancelled"""
+        if path:
+            _remove_stale_socket(path)
+            server = await asyncio.start_unix_server(self._client, path, limit=MAX_REQUEST_BYTES)
+        else:
+            server = await asyncio.start_server(self._client, '127.0.0.1', port, limit=MAX_REQUEST_BYTES)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if path and os.path.exists(path):
+                os.unlink(path)
+
+    async def serve_stdio(self, stdin=None, stdout=None):
+        """Answer requests from stdin on stdout until EOF"""
+        stdin = stdin or sys.stdin.buffer
+        stdout = stdout or sys.stdout.buffer
+        loop = asyncio.get_running_loop()
+
+        async def readline():
+            # A pipe cannot be read asynchronously on every platform
+            line = await loop.run_in_executor(None, stdin.readline, MAX_REQUEST_BYTES + 1)
+            if len(line) > MAX_REQUEST_BYTES and not line.endswith(b'\n'):
+                raise ValueError("Request too large")
+            return line
+
+        async def send(data):
+            stdout.write(data)
+            stdout.flush()
+
+        await self.serve_lines(readline, send)
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def _remove_stale_socket(path):
+    """Remove a socket file left behind by a server that is no longer running"""
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise OSError(f"{path} exists and is not a socket")
+    except FileNotFoundError:
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise OSError(f"A server is already listening on {path}")
+    finally:
+        probe.close()
+
+
+class Client:
+    """Blocking client for a running server, one request at a time"""
+
+    def __init__(self, path=None, port=None):
+        if path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(path)
+        else:
+            self.sock = socket.create_connection(('127.0.0.1', port))
+        self.file = self.sock.makefile('rwb')
+        self._next_id = 0
+
+    def request(self, **fields):
+        """Send one request and return the reply object"""
+        self._next_id += 1
+        fields.setdefault('id', self._next_id)
+        self.file.write((json.dumps(fields) + '\n').encode('utf-8'))
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        return json.loads(line)
+
+    def convert(self, path=None, data=None, width=100, mode='ascii', **options):
+        """Convert an image file or image bytes; raises RuntimeError on failure"""
+        if data is not None:
+            options['data'] = base64.b64encode(data).decode('ascii')
+        else:
+            options['path'] = os.path.abspath(path)
+        reply = self.request(width=width, mode=mode, **options)
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        return reply['ascii']
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve AsciiForge conversions over a socket or stdio')
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument('--socket', metavar='PATH', help='Listen on a Unix domain socket')
+    where.add_argument('--port', type=int, help='Listen on localhost TCP port')
+    where.add_argument('--stdio', action='store_true', help='Read requests from stdin, write replies to stdout')
+    parser.add_argument('-j', '--jobs', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--max-inflight', type=int, default=MAX_INFLIGHT,
+                        help='Outstanding requests per connection (default: %(default)s)')
+    parser.add_argument('--max-queue', type=int,
+                        help=f'Jobs waiting for a worker (default: {QUEUE_PER_JOB} per worker)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the conversion cache')
+    args = parser.parse_args(argv)
+    for option in ('jobs', 'max_inflight', 'max_queue'):
+        value = getattr(args, option)
+        if value is not None and value < 1:
+            parser.error(f"--{option.replace('_', '-')} must be at least 1, got {value}")
+
+    if args.socket and not hasattr(socket, 'AF_UNIX'):
+        print("Error: Unix domain sockets are not available here; use --port", file=sys.stderr)
+        return 1
+    server = ConversionServer(args.jobs, args.max_inflight, args.max_queue, not args.no_cache)
+    # Let SIGTERM unwind like Ctrl+C so the socket file is removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        if args.stdio:
+            asyncio.run(server.serve_stdio())
+        else:
+            print(f"Serving on {args.socket or f'127.0.0.1:{args.port}'} with {server.jobs} worker(s)",
+                  file=sys.stderr)
+            asyncio.run(server.serve_socket(args.socket, args.port))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
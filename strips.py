@@ -0,0 +1,263 @@
+"""
+Strips module for AsciiForge - Bounded-memory conversion of very large images
+
+The regular converters decode and resize the whole source image at once,
+which for a 20k x 20k picture allocates gigabytes before the first glyph is
+produced. This module decodes the source in horizontal strips, converts
+each strip to grayscale immediately and box-averages it into the target
+character grid, yielding finished ASCII rows as it goes.
+
+Strip decoding is used for non-interlaced 8-bit PNGs and uncompressed
+single-tile formats (BMP, PPM, uncompressed TIFF). JPEGs are decoded at a
+reduced DCT scale. Any other format falls back to a single full decode.
+"""
+import io
+import math
+import struct
+import zlib
+from PIL import BmpImagePlugin, Image, JpegImagePlugin, PpmImagePlugin, TiffImagePlugin
+
+import converter
+
+
+STRIP_HEIGHT = 256  # source rows decoded at a time
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+READ_SIZE = 1 << 16
+
+# Formats opened from their header alone: strip decoded, or scaled while decoding
+HEADER_FORMATS = (BmpImagePlugin.BmpImageFile, PpmImagePlugin.PpmImageFile,
+                  TiffImagePlugin.TiffImageFile, JpegImagePlugin.JpegImageFile)
+
+
+def _png_chunk(kind, data):
+    """Serialize a single PNG chunk"""
+    crc = zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff
+    return b''.join((struct.pack('>I', len(data)), kind, data, struct.pack('>I', crc)))
+
+
+def _png_strips(fp, strip_height):
+    """Yield (width, height) and then the strips of a non-interlaced 8-bit PNG
+
+    Scanlines are inflated incrementally. Each strip is re-wrapped as a small
+    stand-alone PNG whose first row is the previous strip's last row stored
+    unfiltered, so PNG's row-to-row filters still decode correctly.
+    The first item is None if the file is not a supported PNG.
+    """
+    if fp.read(8) != PNG_SIGNATURE:
+        yield None
+        return
+    header = {}
+    ancillary = b''
+    idat_remaining = 0
+
+    def next_chunk():
+        length, kind = struct.unpack('>I4s', fp.read(8))
+        return length, kind
+
+    # Read the chunks preceding the image data
+    while True:
+        length, kind = next_chunk()
+        if kind == b'IDAT':
+            idat_remaining = length
+            break
+        data = fp.read(length)
+        fp.read(4)  # CRC
+        if kind == b'IHDR':
+            header = dict(zip(('width', 'height', 'depth', 'color', 'compression', 'filter', 'interlace'),
+                              struct.unpack('>IIBBBBB', data)))
+        elif kind in (b'PLTE', b'tRNS'):
+            ancillary += _png_chunk(kind, data)
+        elif kind == b'IEND':
+            yield None
+            return
+
+    if header.get('depth') != 8 or header.get('interlace') or header.get('color') not in PNG_CHANNELS:
+        yield None
+        return
+
+    width, height = header['width'], header['height']
+    row_bytes = width * PNG_CHANNELS[header['color']]
+    scanline = row_bytes + 1
+    yield width, height
+
+    def idat_data():
+        nonlocal idat_remaining
+        while True:
+            while idat_remaining:
+                data = fp.read(min(READ_SIZE, idat_remaining))
+                if not data:
+                    return
+                idat_remaining -= len(data)
+                yield data
+            fp.read(4)  # CRC
+            length, kind = next_chunk()
+            if kind != b'IDAT':
+                return
+            idat_remaining = length
+
+    inflater = zlib.decompressobj()
+    compressed = idat_data()
+    pending = b''
+    previous = None
+    y = 0
+    while y < height:
+        rows = min(strip_height, height - y)
+        wanted = rows * scanline
+        # The previous strip's last row, unfiltered, seeds the PNG filters
+        raw = bytearray(b'\x00' + previous) if previous is not None else bytearray()
+        wanted += len(raw)
+        while len(raw) < wanted:
+            if not pending:
+                pending = next(compressed, b'')
+                if not pending:
+                    raise ValueError("PNG image data is truncated")
+            raw += inflater.decompress(pending, wanted - len(raw))
+            pending = inflater.unconsumed_tail
+        band_height = rows + (previous is not None)
+        ihdr = struct.pack('>IIBBBBB', width, band_height, 8, header['color'], 0, 0, 0)
+        band_png = (PNG_SIGNATURE + _png_chunk(b'IHDR', ihdr) + ancillary
+                    + _png_chunk(b'IDAT', zlib.compress(raw, 0)) + _png_chunk(b'IEND', b''))
+        del raw
+        band = Image.open(io.BytesIO(band_png))
+        band.load()
+        strip = band if previous is None else band.crop((0, 1, width, band_height))
+        previous = band.crop((0, band_height - 1, width, band_height)).tobytes()
+        del band_png, band
+        yield strip
+        y += rows
+
+
+def _raw_layout(image):
+    """Return (offset, rawmode, stride, ystep) for an uncompressed image, or None"""
+    if len(image.tile) != 1 or image.mode == 'P':
+        return None
+    codec, extents, offset, args = image.tile[0]
+    if codec != 'raw' or tuple(extents) != (0, 0) + image.size:
+        return None
+    if not isinstance(args, tuple):
+        args = (args,)
+    rawmode, stride, ystep = (tuple(args) + (0, 1))[:3]
+    if not stride:
+        if rawmode != image.mode:
+            return None
+        stride = len(Image.new(image.mode, (image.width, 1)).tobytes())
+    return offset, rawmode, stride, ystep
+
+
+def _raw_strips(image, layout, strip_height):
+    """Yield strips of an uncompressed single-tile image read straight from disk"""
+    offset, rawmode, stride, ystep = layout
+    width, height = image.size
+    fp = image.fp
+    for y in range(0, height, strip_height):
+        rows = min(strip_height, height - y)
+        # Bottom-up files (BMP) store the last image row first
+        first_row = y if ystep >= 0 else height - y - rows
+        fp.seek(offset + first_row * stride)
+        data = fp.read(rows * stride)
+        yield Image.frombuffer(image.mode, (width, rows), data, 'raw', rawmode, stride, ystep)
+
+
+def _loaded_strips(image, strip_height, new_width):
+    """Yield strips of a fully decoded image (fallback for other formats)"""
+    if image.format == 'JPEG':
+        # Let the JPEG decoder scale down by up to 8x while decoding
+        cols, rows = converter.target_size(image.size, new_width)
+        image.draft('L', (cols * 2, max(1, rows * 2)))
+    if Image.MAX_IMAGE_PIXELS and image.width * image.height > 2 * Image.MAX_IMAGE_PIXELS:
+        raise Image.DecompressionBombError(
+            f"Image size ({image.width * image.height} pixels) exceeds limit for full decoding")
+    gray = converter.grayscale(image)
+    for y in range(0, gray.height, strip_height):
+        yield gray.crop((0, y, gray.width, min(gray.height, y + strip_height)))
+
+
+def _open_header(image_path):
+    """Open an image without Pillow's decompression bomb check
+
+    Formats in HEADER_FORMATS are opened by their plugin directly, which
+    reads only the header; strip decoding keeps their memory bounded, and
+    ``_loaded_strips`` applies the size limit if one is decoded in full.
+    Anything else goes through ``Image.open`` and its usual checks.
+    """
+    for factory in HEADER_FORMATS:
+        try:
+            return factory(image_path)
+        except SyntaxError:
+            continue
+    return Image.open(image_path)
+
+
+def iter_strips(image_path, strip_height=STRIP_HEIGHT, new_width=100):
+    """Yield (source size, grayscale strip) pairs covering an image top to bottom
+
+    The source size is the full-resolution size for strip-decoded formats
+    and the reduced decode size for JPEG drafts.
+    """
+    with open(image_path, 'rb') as fp:
+        png = _png_strips(fp, strip_height)
+        size = next(png)
+        if size is not None:
+            for strip in png:
+                yield size, converter.grayscale(strip)
+            return
+
+    image = _open_header(image_path)
+    with image:
+        layout = _raw_layout(image)
+        if layout:
+            strips = (converter.grayscale(strip) for strip in _raw_strips(image, layout, strip_height))
+            size = image.size
+        else:
+            strips = _loaded_strips(image, strip_height, new_width)
+            size = None
+        for strip in strips:
+            yield size or image.size, strip
+
+
+def iter_ascii_rows(image_path, width=100, chars=converter.ASCII_CHARS, strip_height=STRIP_HEIGHT):
+    """Convert an image to ASCII art, yielding one finished row at a time
+
+    Each character cell is the area average (box filter) of the source
+    pixels it covers. Peak memory is proportional to one strip of the
+    source rather than the whole decoded image.
+    """
+    buffer = None   # grayscale source rows not yet fully consumed
+    buffer_top = 0  # source row index of the buffer's first row
+    row = 0
+    for size, strip in iter_strips(image_path, strip_height, width):
+        cols, rows = converter.target_size(size, width)
+        if rows <= 0:
+            return
+        cell_height = size[1] / rows
+        if buffer is None:
+            buffer = strip
+        else:
+            joined = Image.new('L', (strip.width, buffer.height + strip.height))
+            joined.paste(buffer, (0, 0))
+            joined.paste(strip, (0, buffer.height))
+            buffer = joined
+        available = buffer_top + buffer.height
+        # Output rows whose source span is fully inside the buffer
+        if available >= size[1]:
+            end = rows
+        else:
+            end = min(rows, int(available / cell_height))
+        if end > row:
+            top, bottom = row * cell_height, end * cell_height
+            cells = buffer.resize((cols, end - row), Image.BOX,
+                                  box=(0, top - buffer_top, buffer.width, min(bottom, available) - buffer_top))
+            art = converter.pixels_to_ascii(cells, chars)
+            for start in range(0, len(art), cols):
+                yield art[start:start + cols]
+            row = end
+            keep_from = max(0, int(math.floor(bottom)) - buffer_top)
+            buffer = buffer.crop((0, keep_from, buffer.width, buffer.height))
+            buffer_top += keep_from
+
+
+def convert_file(image_path, width=100, chars=converter.ASCII_CHARS):
+    """Convert an image file to ASCII art using bounded-memory strip decoding"""
+    return '\n'.join(iter_ascii_rows(image_path, width, chars))
@@ -0,0 +1,137 @@
+"""
+Subpixel module for AsciiForge - High-density Braille and half-block renderers
+
+The brightness ramp spends one character on one resized pixel. These
+renderers pack several on/off sub-pixels into each character instead:
+
+    braille     2x4 dots per cell, U+2800 + dot bits      (8x the pixels)
+    halfblock   upper and lower half per cell, ' ▀▄█'      (2x the pixels)
+
+The image is resized once to the sub-pixel grid and thresholded (or
+dithered) with Pillow. Each position in the cell is split out as a plane
+covering all cells, its on pixels are turned into that position's bit with
+a byte lookup, and the planes are added together, giving one code per cell.
+A precomputed table maps the codes to characters in a single
+``str.translate``, so no Python code runs per pixel.
+
+Dots mark dark pixels, like the dense end of the ASCII ramp; ``invert``
+marks light pixels instead, which suits light-on-dark terminals.
+"""
+from functools import lru_cache
+from PIL import Image, ImageChops
+
+import converter
+import instrument
+
+
+RENDER_MODES = ('braille', 'halfblock')
+
+# Sub-pixels per cell (columns, rows)
+GRIDS = {'braille': (2, 4), 'halfblock': (1, 2)}
+
+# Code bit of each sub-pixel, by row then column. Braille dots 1-3 and 4-6
+# run down the left and right columns; dots 7 and 8 form the bottom row.
+BITS = {
+    'braille': (0x01, 0x08, 0x02, 0x10, 0x04, 0x20, 0x40, 0x80),
+    'halfblock': (0x01, 0x02),
+}
+
+CHARS = {
+    'braille': [chr(0x2800 + code) for code in range(256)],
+    'halfblock': [' ', '▀', '▄', '█'],
+}
+
+DEFAULT_THRESHOLD = 128
+
+# Dithering supported by the sub-pixel renderers
+DITHER_MODES = ('floyd-steinberg', 'bayer')
+
+
+def grid_size(size, width=100, mode='braille'):
+    """Return the (columns, rows) character grid and the sub-pixel image size"""
+    columns, rows = converter.target_size(size, width)
+    grid_x, grid_y = GRIDS[mode]
+    return (columns, rows), (columns * grid_x, rows * grid_y)
+
+
+def _bayer_threshold(size):
+    """Ordered-dither threshold image spanning the full 0-255 range"""
+    width, height = size
+    rows = []
+    for matrix_row in converter.BAYER_8:
+        row = bytes(threshold * 4 + 2 for threshold in matrix_row)
+        rows.append((row * (width // 8 + 1))[:width])
+    return Image.frombytes('L', size, b''.join(rows[y % 8] for y in range(height)))
+
+
+def ink_mask(image, threshold=DEFAULT_THRESHOLD, invert=False, dither=None):
+    """Return an 'L' image that is 255 on the sub-pixels to draw and 0 elsewhere
+
+    ``threshold`` only applies without ``dither``.
+    """
+    if dither is None:
+        if invert:
+            table = [255 if value >= threshold else 0 for value in range(256)]
+        else:
+            table = [255 if value < threshold else 0 for value in range(256)]
+        return image.point(table)
+    if dither == 'floyd-steinberg':
+        # Pillow diffuses the error in C when converting to 1-bit
+        mask = image.convert('1').convert('L')
+    elif dither == 'bayer':
+        mask = ImageChops.subtract(image, _bayer_threshold(image.size), 1.0, 128)
+        mask = mask.point([255 if value >= 128 else 0 for value in range(256)])
+    else:
+        raise ValueError(f"Unknown dither mode: {dither} (choose from {', '.join(DITHER_MODES)})")
+    # Both masks mark light pixels
+    return mask if invert else ImageChops.invert(mask)
+
+
+@lru_cache(maxsize=16)
+def _bit_table(bit):
+    """``bytes.translate`` table turning ink (any non-zero value) into ``bit``"""
+    return bytes(bit if value else 0 for value in range(256))
+
+
+def pack_cells(mask, mode='braille'):
+    """Pack an ink mask into one code per cell, as bytes"""
+    grid = GRIDS[mode]
+    size = (mask.width // grid[0], mask.height // grid[1])
+    codes = None
+    for plane, bit in zip(converter.split_planes(mask, grid), BITS[mode]):
+        plane = Image.frombytes('L', size, plane.translate(_bit_table(bit)))
+        # Every plane has its own bit, so the sum never overflows a byte
+        codes = plane if codes is None else ImageChops.add(codes, plane)
+    return codes.tobytes()
+
+
+def render_cells(image, mode='braille', threshold=DEFAULT_THRESHOLD, invert=False, dither=None):
+    """Render a grayscale image already sized to the sub-pixel grid, as a flat string"""
+    if mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode: {mode} (choose from {', '.join(RENDER_MODES)})")
+    with instrument.span(f'{mode}_render') as span:
+        span.count(pixels=image.width * image.height)
+        codes = pack_cells(ink_mask(image, threshold, invert, dither), mode)
+        return converter.map_indices(codes, CHARS[mode])
+
+
+def image_to_subpixels(image, width=100, mode='braille', threshold=DEFAULT_THRESHOLD, invert=False,
+                       dither=None):
+    """Convert a PIL image to Braille or half-block art ``width`` characters wide"""
+    if mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode: {mode} (choose from {', '.join(RENDER_MODES)})")
+    (columns, rows), size = grid_size(image.size, width, mode)
+    if columns <= 0 or rows <= 0:
+        return ''
+    with instrument.span('resize') as span:
+        span.count(pixels=image.width * image.height)
+        small = image.resize(size)
+    cells = render_cells(converter.grayscale(small), mode, threshold, invert, dither)
+    return converter.join_rows(cells, columns)
+
+
+def convert_file(image_path, width=100, mode='braille', threshold=DEFAULT_THRESHOLD, invert=False,
+                 dither=None):
+    """Open an image file and convert it to Braille or half-block art"""
+    with converter.open_image(image_path) as image:
+        return image_to_subpixels(image, width, mode, threshold, invert, dither)
@@ -0,0 +1,173 @@
+"""
+Terminal module for AsciiForge - Diff-based terminal rendering
+
+TerminalRenderer keeps a copy of the rows on screen. For each new frame it
+writes only cursor moves plus the runs of cells that changed, as one write
+wrapped in a synchronized-update block so the terminal shows the frame all
+at once (terminals without support ignore the markers). Frames can be given
+whole or as (row, column, text) spans, such as those from
+``animation.animation_frames`` and ``AsciiCanvas.changes_since``.
+
+FramePacer paces a frame loop to a target rate. Frames that are already
+late are not drawn; their changes are kept and drawn with the next frame,
+and the drop is counted.
+
+Rows are plain text with one terminal column per character.
+"""
+import sys
+import time
+from itertools import count
+
+
+CSI = '\x1b['
+HIDE_CURSOR = CSI + '?25l'
+SHOW_CURSOR = CSI + '?25h'
+CLEAR_SCREEN = CSI + '2J'
+SYNC_BEGIN = CSI + '?2026h'
+SYNC_END = CSI + '?2026l'
+
+# Unchanged cells between two changed runs are rewritten when that is
+# shorter than the cursor move needed to skip them
+MERGE_GAP = 8
+
+DEFAULT_FPS = 60
+# A frame loop this far behind schedule starts a new schedule
+RESYNC_AFTER = 1.0  # s
+
+
+def changed_runs(old, new, gap=MERGE_GAP):
+    """Return (column, text) runs that turn row ``old`` into row ``new``
+
+    Runs separated by fewer than ``gap`` unchanged cells are merged. Cells
+    of ``old`` past the end of ``new`` are not covered; erase them separately.
+    """
+    if old == new:
+        return []
+    changed = [i for i, a, b in zip(count(), old, new) if a != b]
+    changed.extend(range(min(len(old), len(new)), len(new)))
+    runs = []
+    start = end = None
+    for i in changed:
+        if start is None:
+            start = end = i
+        elif i - end > gap:
+            runs.append((start, new[start:end + 1]))
+            start = end = i
+        else:
+            end = i
+    if start is not None:
+        runs.append((start, new[start:end + 1]))
+    return runs
+
+
+class TerminalRenderer:
+    """Draw successive frames in a terminal, writing only what changed"""
+
+    def __init__(self, out=None, gap=MERGE_GAP):
+        self.out = out or sys.stdout
+        self.gap = gap
+        self.screen = []   # rows currently on screen
+        self.target = []   # rows of the frame being built
+        self._dirty = set()
+        self.bytes_written = 0
+
+    def start(self):
+        """Clear the screen and hide the cursor"""
+        self.screen = []
+        self._dirty = set(range(len(self.target)))
+        self._write(HIDE_CURSOR + CLEAR_SCREEN)
+
+    def stop(self):
+        """Leave the cursor below the frame and show it again"""
+        self._write(f'{CSI}{max(len(self.screen), 1) + 1};1H' + SHOW_CURSOR)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def set_frame(self, frame):
+        """Replace the pending frame with ``frame`` (a string or a list of rows)"""
+        rows = frame.split('\n') if isinstance(frame, str) else list(frame)
+        target = self.target
+        for y in range(max(len(rows), len(target))):
+            if y >= len(rows) or y >= len(target) or rows[y] != target[y]:
+                self._dirty.add(y)
+        self.target = rows
+
+    def update(self, spans):
+        """Apply (row, column, text) spans to the pending frame"""
+        target = self.target
+        for row, column, text in spans:
+            while len(target) <= row:
+                target.append('')
+            line = target[row]
+            if len(line) < column:
+                line += ' ' * (column - len(line))
+            target[row] = line[:column] + text + line[column + len(text):]
+            self._dirty.add(row)
+
+    def present(self):
+        """Write the pending frame's changes in one write; returns the bytes written"""
+        if not self._dirty:
+            return 0
+        screen, target = self.screen, self.target
+        parts = [SYNC_BEGIN]
+        for y in sorted(self._dirty):
+            old = screen[y] if y < len(screen) else ''
+            new = target[y] if y < len(target) else ''
+            for column, text in changed_runs(old, new, self.gap):
+                parts.append(f'{CSI}{y + 1};{column + 1}H{text}')
+            if len(new) < len(old):
+                parts.append(f'{CSI}{y + 1};{len(new) + 1}H{CSI}K')
+        parts.append(SYNC_END)
+        self._dirty.clear()
+        self.screen = list(target)
+        return self._write(''.join(parts)) if len(parts) > 2 else 0
+
+    def render(self, frame):
+        """Set and present a whole frame"""
+        self.set_frame(frame)
+        return self.present()
+
+    def _write(self, data):
+        self.out.write(data)
+        self.out.flush()
+        self.bytes_written += len(data)
+        return len(data)
+
+
+class FramePacer:
+    """Pace a frame loop to ``fps`` frames per second, dropping late frames
+
+    Call ``tick()`` once per frame; it sleeps until the frame's time and
+    returns True, or returns False without sleeping when the frame is
+    already late and should be skipped.
+    """
+
+    def __init__(self, fps=DEFAULT_FPS):
+        self.interval = 1 / (fps or DEFAULT_FPS)
+        self.shown = 0
+        self.dropped = 0
+        self._next = None
+
+    def tick(self, duration=None):
+        """Wait for the next frame's slot; ``duration`` overrides the frame interval (s)"""
+        now = time.monotonic()
+        if self._next is None or now - self._next > RESYNC_AFTER:
+            self._next = now
+        slot = self._next
+        self._next += self.interval if duration is None else duration
+        if now >= self._next:
+            # Even the following frame's slot has started
+            self.dropped += 1
+            return False
+        if slot > now:
+            time.sleep(slot - now)
+        self.shown += 1
+        return True
+
+    def stats(self):
+        return {'shown': self.shown, 'dropped': self.dropped}
@@ -0,0 +1,128 @@
+"""
+Worker module for AsciiForge - Background conversions for the GUI
+"""
+import queue
+import threading
+
+import cache
+import converter
+
+
+POLL_INTERVAL = 50  # ms between checks for worker events
+
+
+class ConversionCancelled(Exception):
+    """Raised inside a task when the user cancels it"""
+
+
+class BackgroundTask:
+    """Run a function on a worker thread and marshal its events back to Tk
+
+    ``func`` is called as ``func(task, *args)`` on the worker thread. It may
+    call ``task.report(fraction, message)`` to publish progress and
+    ``task.check_cancelled()`` between stages to honour cancel requests.
+    The ``on_*`` callbacks always run on the Tk thread via ``root.after``.
+    """
+
+    def __init__(self, root, func, *args, on_progress=None, on_done=None,
+                 on_error=None, on_cancel=None):
+        self.root = root
+        self.func = func
+        self.args = args
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self._events = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread and begin polling for its events"""
+        self._thread = threading.Thread(target=self._run, name='asciiforge-worker', daemon=True)
+        self._thread.start()
+        self.root.after(POLL_INTERVAL, self._poll)
+        return self
+
+    def cancel(self):
+        """Ask the task to stop at its next cancellation check"""
+        self._cancel.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def report(self, fraction, message=''):
+        """Publish progress from the worker thread"""
+        self._events.put(('progress', (fraction, message)))
+
+    def check_cancelled(self):
+        """Raise ConversionCancelled if cancel() has been called"""
+        if self._cancel.is_set():
+            raise ConversionCancelled()
+
+    def _run(self):
+        try:
+            result = self.func(self, *self.args)
+        except ConversionCancelled:
+            self._events.put(('cancelled', None))
+        except Exception as e:
+            self._events.put(('error', e))
+        else:
+            self._events.put(('done', result))
+
+    def _poll(self):
+        finished = False
+        try:
+            while True:
+                kind, value = self._events.get_nowait()
+                if kind == 'progress':
+                    if self.on_progress:
+                        self.on_progress(*value)
+                    continue
+                finished = True
+                if kind == 'done':
+                    if self.on_done:
+                        self.on_done(value)
+                elif kind == 'error':
+                    if self.on_error:
+                        self.on_error(value)
+                elif self.on_cancel:
+                    self.on_cancel()
+        except queue.Empty:
+            pass
+        if not finished:
+            self.root.after(POLL_INTERVAL, self._poll)
+
+
+def convert_image_file(task, image_path, width=100, chars=converter.ASCII_CHARS):
+    """Convert an image in stages, reporting progress and honouring cancel
+
+    Produces the same art as ``cache.convert_file`` and shares its cache.
+    """
+    conversion_cache = cache.default_cache()
+    task.report(0.05, "Checking cache...")
+    key = conversion_cache.conversion_key(image_path, width, chars)
+    art = conversion_cache.get(key)
+    if art is not None:
+        task.report(1.0, "Loaded from cache")
+        return art
+
+    task.check_cancelled()
+    task.report(0.1, "Decoding image...")
+    with converter.open_image(image_path) as image:
+        task.check_cancelled()
+        task.report(0.5, "Resizing...")
+        small = converter.resize_image(image, width)
+
+    task.check_cancelled()
+    task.report(0.8, "Mapping characters...")
+    art = converter.frame_to_ascii(converter.grayscale(small), chars)
+
+    task.check_cancelled()
+    try:
+        conversion_cache.put(key, art)
+    except OSError:
+        pass
+    task.report(1.0, "Done")
+    return art